@@ -1,16 +1,74 @@
 import streamlit as st
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from api_manager import APIManager
 from database import Database
 from comparator import ResponseComparator
-
-# Initialize
-db = Database()
-api_manager = APIManager()
-comparator = ResponseComparator()
+from runner import PairedRunner
+from rules import ComparisonRules
+from capture import storage_fields, parse_stored
+from suites import iter_suite
+from timing import PHASES, PHASE_LABELS, PHASE_CAUSES
+from regression import RegressionAnalyzer, REGRESSION, IMPROVEMENT, INSUFFICIENT_DATA
+from replay import ExchangeRecorder, ReplayStore
+from dashboard import SuiteDashboard, DIFFERENT, MISSING
+from config import (RESPONSE_SPILL_THRESHOLD, MAX_RESULTS_DISPLAY, LOAD_DEFAULT_DURATION,
+                    LOAD_DEFAULT_CONCURRENCY)
 
 st.set_page_config(page_title="API Comparator", layout="wide")
+
+# Initialize once per server process; every session and rerun shares these
+@st.cache_resource
+def get_database() -> Database:
+    return Database()
+
+@st.cache_resource
+def get_api_manager(mode: str = "Live") -> APIManager:
+    if mode == "Record":
+        return APIManager(recorder=ExchangeRecorder(get_database()))
+    if mode == "Replay":
+        return APIManager(replay=ReplayStore(get_database()))
+    return APIManager()
+
+@st.cache_resource
+def get_comparator() -> ResponseComparator:
+    # Results are stored by response hashes, so reopening a comparison does not diff it again
+    return ResponseComparator(store=get_database())
+
+db = get_database()
+
+# Record saves every exchange sent; Replay answers from those recordings offline
+request_mode = st.sidebar.radio(
+    "Request Mode",
+    ["Live", "Record", "Replay"],
+    help="Record saves raw request/response exchanges; Replay serves them back without calling the APIs"
+)
+if request_mode != "Live":
+    st.sidebar.caption(f"{db.count_recorded_exchanges()} recorded exchange(s)")
+api_manager = get_api_manager(request_mode)
+comparator = get_comparator()
+runner = PairedRunner(db, api_manager, comparator)
+regression_analyzer = RegressionAnalyzer(db)
+suite_dashboard = SuiteDashboard(db, comparator)
+
+def load_summary_rows(before: dict, after: dict) -> list:
+    """Rows comparing two load test summaries for st.table"""
+    rows = []
+    for label, key, scale, unit in (
+        ("Requests", "requests", 1, ""), ("Errors", "errors", 1, ""),
+        ("Throughput", "throughput", 1, " req/s"), ("p50", "p50", 1000, " ms"),
+        ("p90", "p90", 1000, " ms"), ("p99", "p99", 1000, " ms"), ("Max", "max", 1000, " ms")
+    ):
+        b, a = before[key] * scale, after[key] * scale
+        change = f"{(a - b) / b:+.1%}" if b else ""
+        rows.append({
+            "Metric": label,
+            "Before Change": f"{b:,.1f}{unit}" if unit else f"{b:,}",
+            "After Change": f"{a:,.1f}{unit}" if unit else f"{a:,}",
+            "Change": change
+        })
+    return rows
+
 st.title("🔄 API Testing & Comparison Tool")
 
 # Sidebar for navigation
@@ -175,6 +233,48 @@ elif menu == "Execute Tests":
         selected_config_name = st.selectbox("Select API Configuration", list(config_options.keys()))
         selected_config = config_options[selected_config_name]
         
+        versions = {c['api_version'] for c in configs_for_task}
+        run_paired = st.checkbox(
+            "Run 'Before Change' and 'After Change' side-by-side",
+            value=False,
+            disabled=not {"Before Change", "After Change"} <= versions,
+            help="Sends the same payload to both versions at the same time and compares the responses"
+        )
+        
+        # Bulk import of test cases from suite files
+        with st.expander(f"📦 Test Suite ({db.count_test_cases(selected_task)} imported cases)"):
+            st.caption(
+                'Upload a JSON list, a YAML file or JSONL (one case per line). Each case has a '
+                '"name" and optional "payload", "query_params" and "ignore"/"rules" masks.'
+            )
+            st.code('{"name": "ValidFlight", "payload": {"flightNumber": "AA123"}, "ignore": ["**.timestamp"]}')
+            suite_file = st.file_uploader("Suite File", type=["json", "jsonl", "ndjson", "yaml", "yml"])
+            replace_suite = st.checkbox("Replace the task's imported cases", value=False)
+            if suite_file is not None and st.button("📥 Import Suite"):
+                try:
+                    imported = db.import_test_cases(selected_task, iter_suite(suite_file), replace=replace_suite)
+                    st.success(f"✅ Imported {imported} test case(s)")
+                except (ValueError, ImportError) as e:
+                    st.error(f"❌ Import failed: {str(e)}")
+            
+            if st.button("▶️ Run Imported Suite", disabled=not run_paired or not db.count_test_cases(selected_task),
+                         help="Runs every imported case against both versions (enable side-by-side above)"):
+                progress = st.progress(0.0)
+                total = db.count_test_cases(selected_task)
+                failed = []
+                with st.spinner("Executing suite on both versions..."):
+                    for done, run in enumerate(
+                        runner.run_suite(selected_task, db.iter_test_cases(selected_task)), start=1
+                    ):
+                        if not run['comparison']['identical'] or \
+                                run['before']['status_code'] != run['after']['status_code']:
+                            failed.append(run['test_case_name'])
+                        progress.progress(done / total)
+                if failed:
+                    st.warning(f"⚠️ {len(failed)} of {total} case(s) differ: {', '.join(failed[:MAX_RESULTS_DISPLAY])}")
+                else:
+                    st.success(f"✅ All {total} case(s) match")
+        
         st.divider()
         
         # Test Case Name
@@ -220,7 +320,46 @@ elif menu == "Execute Tests":
         with col1:
             execute_btn = st.button("▶️ Execute Test", type="primary")
         
-        if execute_btn:
+        if execute_btn and run_paired:
+            if not test_case_name:
+                st.error("❌ Please provide a test case name")
+            else:
+                with st.spinner("Executing API calls on both versions..."):
+                    try:
+                        run = runner.run_pair(
+                            task_name=selected_task,
+                            test_case_name=test_case_name,
+                            payload=payload,
+                            query_params=query_params
+                        )
+                        
+                        st.success(f"✅ Paired run {run['run_id']} executed successfully!")
+                        
+                        col1, col2 = st.columns(2)
+                        for col, label, response in (
+                            (col1, "🔴 Before Change", run['before']),
+                            (col2, "🟢 After Change", run['after'])
+                        ):
+                            with col:
+                                st.subheader(label)
+                                st.metric("Status Code", response['status_code'])
+                                st.metric("Response Time", f"{response['response_time']:.2f}s")
+                                if response['body_size'] > RESPONSE_SPILL_THRESHOLD:
+                                    st.info(f"Response of {response['body_size']} bytes is too large to display")
+                                else:
+                                    st.json(response['body'])
+                        
+                        if run['comparison']['identical']:
+                            st.success("✅ Responses are identical!")
+                        else:
+                            st.warning("⚠️ Differences detected:")
+                            for diff in run['comparison']['differences']:
+                                st.write(f"- {diff}")
+                    
+                    except Exception as e:
+                        st.error(f"❌ Error: {str(e)}")
+        
+        elif execute_btn:
             if not test_case_name:
                 st.error("❌ Please provide a test case name")
             else:
@@ -233,14 +372,18 @@ elif menu == "Execute Tests":
                         )
                         
                         # Save to database
-                        db.save_test_result(
-                            config_id=selected_config['id'],
-                            test_case_name=test_case_name,
-                            request_payload=json.dumps(payload),
-                            response_data=json.dumps(response['body']),
-                            status_code=response['status_code'],
-                            response_time=response['response_time']
-                        )
+                        db.save_test_results_bulk([{
+                            "config_id": selected_config['id'],
+                            "test_case_name": test_case_name,
+                            "request_payload": json.dumps(payload),
+                            **storage_fields(response),
+                            "status_code": response['status_code'],
+                            "response_time": response['response_time'],
+                            "query_params": query_params,
+                            "timings": response.get('timings'),
+                            "attempts": response.get('attempts', 1),
+                            "backoff_time": response.get('backoff_time', 0.0)
+                        }])
                         
                         st.success(f"✅ Test executed successfully!")
                         
@@ -248,13 +391,57 @@ elif menu == "Execute Tests":
                         col1, col2, col3 = st.columns(3)
                         col1.metric("Status Code", response['status_code'])
                         col2.metric("Response Time", f"{response['response_time']:.2f}s")
-                        col3.metric("Response Size", f"{len(str(response['body']))} bytes")
+                        col3.metric("Response Size", f"{response['body_size']} bytes")
+                        if response.get('attempts', 1) > 1:
+                            st.caption(
+                                f"Took {response['attempts']} attempts, "
+                                f"{response['backoff_time']:.2f}s spent backing off"
+                            )
                         
                         st.subheader("Response")
-                        st.json(response['body'])
-                        
+                        if response['body_size'] > RESPONSE_SPILL_THRESHOLD:
+                            st.info(f"Response of {response['body_size']} bytes is too large to display")
+                        else:
+                            st.json(response['body'])
+                    
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
+        
+        # Sustained load on both versions, for latency percentiles instead of one sample
+        with st.expander("🏋️ Load Test (both versions)"):
+            st.caption("Sends the test case above to both versions over the same time window.")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                load_duration = st.number_input("Duration (s)", min_value=1, max_value=600,
+                                                value=LOAD_DEFAULT_DURATION)
+            with col2:
+                load_mode = st.radio("Load", ["Concurrency", "Target RPS"], horizontal=True)
+            with col3:
+                if load_mode == "Concurrency":
+                    load_level = st.number_input("Concurrent Requests (per version)", min_value=1,
+                                                 max_value=256, value=LOAD_DEFAULT_CONCURRENCY)
+                else:
+                    load_level = st.number_input("Requests per Second (per version)", min_value=0.1,
+                                                 value=10.0, step=1.0)
+            
+            if st.button("🏋️ Run Load Test", disabled=not run_paired,
+                         help="Enable side-by-side above to load both versions"):
+                if not test_case_name:
+                    st.error("❌ Please provide a test case name")
+                else:
+                    with st.spinner(f"Loading both versions for {load_duration}s..."):
+                        try:
+                            load_run = runner.run_load(
+                                selected_task, test_case_name, payload, query_params,
+                                duration=load_duration,
+                                rate=load_level if load_mode == "Target RPS" else None,
+                                concurrency=int(load_level) if load_mode == "Concurrency" else None
+                            )
+                            st.table(load_summary_rows(
+                                load_run["Before Change"].summary(), load_run["After Change"].summary()
+                            ))
+                        except Exception as e:
+                            st.error(f"❌ Error: {str(e)}")
 
 # ==================== Compare Results ====================
 elif menu == "Compare Results":
@@ -266,6 +453,143 @@ elif menu == "Compare Results":
     else:
         selected_task = st.selectbox("Select Task to Compare", tasks)
         
+        # Per-task comparison settings
+        comparison_settings = db.get_comparison_settings(selected_task)
+        with st.expander("⚙️ Comparison Settings"):
+            st.caption(
+                'Paths use dots, [*] for any index, * for any key and ** for any depth. '
+                'Supported keys: "list_modes" ("ordered", "unordered" or "key:<field>" per path), '
+                '"ignore" (paths to mask), "tolerances" (numeric tolerance per path) and '
+                '"normalizers" (regex replacements applied to strings before comparing).'
+            )
+            st.code(
+                '{"list_modes": {"data.flights": "key:id"}, '
+                '"ignore": ["**.timestamp", "meta.request_id"], '
+                '"tolerances": {"**.price": 0.01}, '
+                '"normalizers": [{"path": "**.url", "pattern": "sessionid=[^&]+", "replace": "sessionid=*"}]}',
+                language="json"
+            )
+            settings_text = st.text_area(
+                "Settings (JSON)",
+                value=json.dumps(comparison_settings, indent=2),
+                height=150
+            )
+            if st.button("💾 Save Settings"):
+                try:
+                    new_settings = json.loads(settings_text) if settings_text.strip() else {}
+                    ComparisonRules.from_settings(new_settings)
+                    db.save_comparison_settings(selected_task, new_settings)
+                    comparison_settings = new_settings
+                    st.success("✅ Comparison settings saved!")
+                except (json.JSONDecodeError, ValueError) as e:
+                    st.error(f"❌ Invalid settings: {str(e)}")
+        rules = ComparisonRules.from_settings(comparison_settings)
+        
+        # Latency regressions over every stored execution of every test case
+        with st.expander("📈 Latency Regressions (all test cases)"):
+            st.caption(
+                "Compares all stored response times of each test case between versions. A case is "
+                "flagged when a Mann-Whitney test is significant and the 95% confidence interval "
+                "of the median change is beyond ±5%."
+            )
+            if st.button("Analyze Task"):
+                analyses = regression_analyzer.analyze_task(selected_task)
+                st.table([
+                    {
+                        "Test Case": a.test_case_name,
+                        "Runs (Before/After)": f"{a.before_samples}/{a.after_samples}",
+                        "Median Change": f"{a.change:+.1%}" if a.change is not None else "",
+                        "95% CI": f"{a.ci_low:+.1%} to {a.ci_high:+.1%}" if a.ci_low is not None else "",
+                        "p-value": f"{a.p_value:.3g}" if a.p_value is not None else "",
+                        "Verdict": a.verdict
+                    }
+                    for a in analyses
+                ])
+                regressions = sum(1 for a in analyses if a.verdict == REGRESSION)
+                if regressions:
+                    st.warning(f"⚠️ {regressions} test case(s) got significantly slower")
+                else:
+                    st.success("✅ No significant latency regressions")
+        
+        # Latest before/after pair of every test case, compared in bulk
+        with st.expander("🧮 Suite Overview (all test cases)"):
+            st.caption(
+                "Compares the latest results of both versions for every test case. Unchanged pairs "
+                "come from stored comparisons; the rest are compared across all CPU cores. Click a "
+                "column header to sort."
+            )
+            if st.button("Compare All Test Cases"):
+                overview = suite_dashboard.overview(selected_task)
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Test Cases", len(overview))
+                col2.metric("Different", sum(1 for row in overview if row['status'] == DIFFERENT))
+                col3.metric("Status Changed", sum(1 for row in overview if row['status_changed']))
+                col4.metric("Missing a Version", sum(1 for row in overview if row['status'] == MISSING))
+                st.dataframe(
+                    [
+                        {
+                            "Test Case": row['test_case_name'],
+                            "Result": row['status'],
+                            "Differences": row['differences'],
+                            "Similarity": row['similarity'],
+                            "Status (Before → After)": (
+                                f"{row['before_status_code']} → {row['after_status_code']}"
+                                if row['status'] != MISSING else ""
+                            ),
+                            "Status Changed": row['status_changed'],
+                            "Latency Δ (ms)": (
+                                row['latency_delta'] * 1000 if row['latency_delta'] is not None else None
+                            ),
+                            "Latency Change (%)": (
+                                row['latency_change'] * 100 if row['latency_change'] is not None else None
+                            )
+                        }
+                        for row in overview
+                    ],
+                    column_config={
+                        "Similarity": st.column_config.ProgressColumn(
+                            "Similarity", format="%.2f", min_value=0.0, max_value=1.0
+                        ),
+                        "Latency Δ (ms)": st.column_config.NumberColumn(format="%+.1f"),
+                        "Latency Change (%)": st.column_config.NumberColumn(format="%+.1f%%")
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+        
+        # Schemas are merged from every successful response, catching up on newly saved ones
+        with st.expander("🧬 Schema Drift"):
+            st.caption(
+                "Compares the response schema of each version, merged from all of its stored "
+                "successful responses: fields, types, optionality and list sizes."
+            )
+            if st.button("🔄 Rebuild Schemas", help="Rebuild from all stored results, e.g. ones saved before schemas were kept"):
+                db.rebuild_response_schemas(config['id'] for config in db.get_configs_by_task(selected_task))
+            drift = suite_dashboard.schema_drift(selected_task)
+            if drift is None:
+                st.info("Both versions need a successful response first.")
+            elif drift['identical']:
+                st.success("✅ Response schema unchanged")
+            else:
+                st.warning("⚠️ The response schema changed")
+                st.table(
+                    [{"Path": path, "Change": "added"} for path in drift['added']] +
+                    [{"Path": path, "Change": "removed"} for path in drift['removed']] +
+                    [
+                        {"Path": path, "Change": f"type {'|'.join(c['before'])} → {'|'.join(c['after'])}"}
+                        for path, c in drift['type_changes'].items()
+                    ] +
+                    [
+                        {"Path": path, "Change": f"{c['before']} → {c['after']}"}
+                        for path, c in drift['optionality_changes'].items()
+                    ]
+                )
+            if drift and drift['cardinality_changes']:
+                st.caption("List sizes (min–max items): " + ", ".join(
+                    f"{path} {c['before'][0]}–{c['before'][1]} → {c['after'][0]}–{c['after'][1]}"
+                    for path, c in drift['cardinality_changes'].items()
+                ))
+        
         # Get test cases for this task
         test_cases = db.get_test_cases_by_task(selected_task)
         
@@ -287,6 +611,20 @@ elif menu == "Compare Results":
                 if before and after:
                     st.divider()
                     
+                    before_body = parse_stored(before['response_data'])
+                    after_body = parse_stored(after['response_data'])
+                    
+                    # Masks of an imported suite case apply on top of the task's settings
+                    suite_case = db.get_test_case(selected_task, selected_test_case)
+                    case_rules = rules.merged(suite_case['rules'] if suite_case else None)
+                    
+                    # One structural hashing pass decides whether the responses match
+                    diff_result = comparator.compare_responses(
+                        before_body, after_body,
+                        key1=before['response_hash'], key2=after['response_hash'],
+                        rules=case_rules
+                    )
+                    
                     # Metrics comparison
                     col1, col2, col3 = st.columns(3)
                     with col1:
@@ -303,11 +641,76 @@ elif menu == "Compare Results":
                             delta=f"{time_diff:+.2f}s"
                         )
                     with col3:
-                        responses_match = before['response_data'] == after['response_data']
+                        responses_match = diff_result['identical']
                         st.metric(
                             "Responses Match",
                             "✅ Yes" if responses_match else "❌ No"
                         )
+                    retried = [
+                        f"{label} took {result['attempts']} attempts ({result['backoff_time']:.2f}s backing off)"
+                        for label, result in (("Before", before), ("After", after))
+                        if result['attempts'] > 1
+                    ]
+                    if retried:
+                        st.caption("; ".join(retried))
+                    
+                    # One response time each is noise; test all stored executions instead
+                    latency = regression_analyzer.analyze_task(selected_task, selected_test_case)
+                    if latency and latency[0].verdict != INSUFFICIENT_DATA:
+                        latency = latency[0]
+                        message = (
+                            f"Median latency over {latency.before_samples}/{latency.after_samples} runs: "
+                            f"{latency.before_median * 1000:.1f} → {latency.after_median * 1000:.1f} ms "
+                            f"({latency.change:+.1%}, 95% CI {latency.ci_low:+.1%} to {latency.ci_high:+.1%}, "
+                            f"p={latency.p_value:.3g})"
+                        )
+                        if latency.verdict == REGRESSION:
+                            st.error(f"🐢 Significant slowdown. {message}")
+                        elif latency.verdict == IMPROVEMENT:
+                            st.success(f"🚀 Significant speedup. {message}")
+                        else:
+                            st.info(f"No significant latency change. {message}")
+                    
+                    # Latency percentiles from the latest load test of this case
+                    load_results = db.get_load_results(selected_task, selected_test_case, limit=2)
+                    if len(load_results) == 2 and load_results[0]['run_id'] == load_results[1]['run_id']:
+                        by_version = {r['api_version']: r for r in load_results}
+                        with st.expander(f"🏋️ Load Test ({load_results[0]['executed_at']})", expanded=True):
+                            st.table(load_summary_rows(by_version["Before Change"], by_version["After Change"]))
+                    
+                    # Per-phase latency, to tell server time from transfer of a bigger payload
+                    if before.get('timings') or after.get('timings'):
+                        with st.expander("⏱️ Latency Breakdown"):
+                            before_timings = json.loads(before['timings'] or '{}')
+                            after_timings = json.loads(after['timings'] or '{}')
+                            rows = []
+                            for phase in PHASES:
+                                before_ms = before_timings.get(phase, 0.0) * 1000
+                                after_ms = after_timings.get(phase, 0.0) * 1000
+                                rows.append({
+                                    "Phase": PHASE_LABELS[phase],
+                                    "Before (ms)": f"{before_ms:.1f}",
+                                    "After (ms)": f"{after_ms:.1f}",
+                                    "Change (ms)": f"{after_ms - before_ms:+.1f}"
+                                })
+                            st.table(rows)
+                            before_size = len(before['response_data'].encode('utf-8'))
+                            after_size = len(after['response_data'].encode('utf-8'))
+                            st.caption(
+                                f"Response size: {before_size:,} → {after_size:,} bytes "
+                                f"({after_size - before_size:+,})"
+                            )
+                            
+                            slowest = max(
+                                PHASES,
+                                key=lambda p: after_timings.get(p, 0.0) - before_timings.get(p, 0.0)
+                            )
+                            slowdown = after_timings.get(slowest, 0.0) - before_timings.get(slowest, 0.0)
+                            if slowdown > 0:
+                                st.caption(
+                                    f"Largest slowdown: {PHASE_LABELS[slowest]} "
+                                    f"(+{slowdown * 1000:.1f} ms), which points to {PHASE_CAUSES[slowest]}."
+                                )
                     
                     st.divider()
                     
@@ -317,25 +720,26 @@ elif menu == "Compare Results":
                     with col1:
                         st.subheader("🔴 Before Change")
                         st.write(f"**Executed:** {before['executed_at']}")
-                        st.json(json.loads(before['response_data']))
+                        st.json(before_body)
                     
                     with col2:
                         st.subheader("🟢 After Change")
                         st.write(f"**Executed:** {after['executed_at']}")
-                        st.json(json.loads(after['response_data']))
+                        st.json(after_body)
                     
                     # Detailed Diff
                     st.divider()
                     st.subheader("📊 Detailed Difference Analysis")
                     
-                    diff_result = comparator.compare_responses(
-                        json.loads(before['response_data']),
-                        json.loads(after['response_data'])
-                    )
-                    
                     if diff_result['identical']:
                         st.success("✅ Responses are identical!")
                     else:
+                        similarity = comparator.calculate_similarity_score(
+                            before_body, after_body,
+                            key1=before['response_hash'], key2=after['response_hash']
+                        )
+                        st.metric("Structural Similarity", f"{similarity:.0%}")
+                        
                         st.warning("⚠️ Differences detected:")
                         for diff in diff_result['differences']:
                             st.write(f"- {diff}")
@@ -350,12 +754,57 @@ elif menu == "View History":
     
     tasks = db.get_all_tasks()
     if tasks:
-        filter_task = st.selectbox("Filter by Task", ["All"] + tasks)
+        # Filters run in SQL; only summary columns of one page are loaded
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            filter_task = st.selectbox("Filter by Task", ["All"] + tasks)
+        with col2:
+            filter_version = st.selectbox("Filter by Version", ["All", "Before Change", "After Change"])
+        with col3:
+            status_text = st.text_input("Status Codes", placeholder="e.g., 200, 404")
         
-        if filter_task == "All":
-            history = db.get_all_test_results()
-        else:
-            history = db.get_test_results_by_task(filter_task)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            filter_dates = st.checkbox("Filter by Date")
+            # executed_at is stored in UTC, so the dates are UTC days too
+            today = datetime.now(timezone.utc).date()
+            date_range = st.date_input(
+                "Executed Between (UTC)",
+                value=(today - timedelta(days=7), today),
+                disabled=not filter_dates
+            )
+        with col2:
+            min_time = st.number_input("Min Response Time (s)", min_value=0.0, value=0.0, step=0.1)
+        with col3:
+            max_time = st.number_input("Max Response Time (s, 0 = no limit)", min_value=0.0, value=0.0, step=0.1)
+        
+        try:
+            status_codes = [int(code) for code in status_text.replace(",", " ").split()]
+        except ValueError:
+            st.error("❌ Status codes must be numbers")
+            status_codes = []
+        
+        filters = {
+            "task_name": None if filter_task == "All" else filter_task,
+            "api_version": None if filter_version == "All" else filter_version,
+            "status_codes": status_codes,
+            "min_response_time": min_time or None,
+            "max_response_time": max_time or None
+        }
+        if filter_dates and len(date_range) == 2:
+            filters["executed_from"] = str(date_range[0])
+            filters["executed_to"] = str(date_range[1] + timedelta(days=1))
+        
+        # Keyset pagination: remember the last row of each page visited
+        filters_key = json.dumps(filters, sort_keys=True)
+        if st.session_state.get("history_filters") != filters_key:
+            st.session_state.history_filters = filters_key
+            st.session_state.history_cursors = [None]
+        cursors = st.session_state.history_cursors
+        
+        page = db.get_history_page(**filters, after=cursors[-1], limit=MAX_RESULTS_DISPLAY + 1)
+        has_more = len(page) > MAX_RESULTS_DISPLAY
+        history = page[:MAX_RESULTS_DISPLAY]
         
         if history:
             for result in history:
@@ -369,15 +818,40 @@ elif menu == "View History":
                         st.write(f"**Executed:** {result['executed_at']}")
                         st.write(f"**Status Code:** {result['status_code']}")
                         st.write(f"**Response Time:** {result['response_time']:.2f}s")
+                        if result['attempts'] > 1:
+                            st.write(f"**Attempts:** {result['attempts']}")
                     with col2:
                         st.write(f"**API URL:** {result['api_url']}")
                         st.write(f"**Method:** {result['method']}")
+                        st.write(f"**Response Size:** {result['response_size'] or 0} bytes")
                     
-                    st.write("**Request:**")
-                    st.json(json.loads(result['request_payload']))
-                    
-                    st.write("**Response:**")
-                    st.json(json.loads(result['response_data']))
+                    # Bodies are only fetched and parsed for rows the user opens
+                    if st.checkbox("Show request and response", key=f"history_body_{result['id']}"):
+                        detail = db.get_result_detail(result['id'])
+                        
+                        st.write("**Request:**")
+                        if detail['query_params']:
+                            st.code(detail['query_params'])
+                        st.json(json.loads(detail['request_payload']))
+                        
+                        st.write("**Response:**")
+                        if (result['response_size'] or 0) > RESPONSE_SPILL_THRESHOLD:
+                            st.info(f"Response of {result['response_size']} bytes is too large to display")
+                        else:
+                            st.json(parse_stored(detail['response_data']))
+            
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("⬅️ Newer", disabled=len(cursors) == 1):
+                    cursors.pop()
+                    st.rerun()
+            with col2:
+                st.caption(f"Page {len(cursors)}")
+            with col3:
+                if st.button("Older ➡️", disabled=not has_more):
+                    last = history[-1]
+                    cursors.append((last['executed_at'], last['id']))
+                    st.rerun()
         else:
             st.info("No test results found.")
     else:
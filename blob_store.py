@@ -0,0 +1,65 @@
+import hashlib
+import os
+import zlib
+from typing import BinaryIO, Tuple
+from config import BLOB_COMPRESSION, BLOB_COMPRESSION_LEVEL, BLOB_MIN_COMPRESS_SIZE, RESPONSE_CHUNK_SIZE
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, zlib is used instead
+    zstandard = None
+
+def content_hash(data: bytes) -> str:
+    """Get the key a blob is stored under"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """
+    Compress a blob with the configured codec
+    
+    Returns:
+        Tuple of (codec name, compressed bytes)
+    """
+    if len(data) < BLOB_MIN_COMPRESS_SIZE:
+        return "raw", data
+    if BLOB_COMPRESSION == "zstd" and zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=BLOB_COMPRESSION_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, min(BLOB_COMPRESSION_LEVEL, 9))
+
+
+def compress_file(path: str, target: BinaryIO, chunk_size: int = RESPONSE_CHUNK_SIZE) -> Tuple[str, int]:
+    """
+    Compress a file into target chunk by chunk, as compress() would its contents
+    
+    Returns:
+        Tuple of (codec name, uncompressed size)
+    """
+    size = os.path.getsize(path)
+    if size < BLOB_MIN_COMPRESS_SIZE:
+        codec, compressor = "raw", None
+    elif BLOB_COMPRESSION == "zstd" and zstandard is not None:
+        codec = "zstd"
+        compressor = zstandard.ZstdCompressor(level=BLOB_COMPRESSION_LEVEL).compressobj(size=size)
+    else:
+        codec, compressor = "zlib", zlib.compressobj(min(BLOB_COMPRESSION_LEVEL, 9))
+    
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            target.write(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        target.write(compressor.flush())
+    return codec, size
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """Restore a blob written by compress()"""
+    if codec == "raw":
+        return bytes(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Response blob is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown blob codec: {codec}")
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import tempfile
+import weakref
+from time import perf_counter
+from typing import Any, Dict, Optional
+from config import RESPONSE_SPILL_THRESHOLD, RESPONSE_SPILL_DIR, RESPONSE_CHUNK_SIZE
+
+class CapturedBody:
+    """
+    Response body read in chunks, kept in memory or spilled to disk when large
+    
+    A spilled body's file belongs to its CapturedBody and is deleted when
+    the CapturedBody is, so results must be stored before they are dropped.
+    """
+    
+    def __init__(self, size: int, sha256: str, data: Optional[bytes] = None,
+                 path: Optional[str] = None, encoding: Optional[str] = None,
+                 timings: Optional[Dict[str, float]] = None, content_type: Optional[str] = None):
+        self.size = size
+        self.sha256 = sha256
+        self.path = path
+        self.encoding = encoding or 'utf-8'
+        self.content_type = content_type
+        self._data = data
+        if path is not None:
+            weakref.finalize(self, _remove_quietly, path)
+        # Request phase timings; json() adds the local 'parse' phase
+        self.timings = timings if timings is not None else {}
+        self._parsed = None
+        self._is_json = None
+    
+    @classmethod
+    def from_response(cls, response, spill_threshold: int = RESPONSE_SPILL_THRESHOLD,
+                      spill_dir: str = RESPONSE_SPILL_DIR,
+                      chunk_size: int = RESPONSE_CHUNK_SIZE,
+                      timings: Optional[Dict[str, float]] = None) -> 'CapturedBody':
+        """
+        Read a streamed requests response, hashing it as it arrives
+        
+        Bodies larger than spill_threshold bytes are written to a
+        ``<spill_dir>/*.body`` file instead of being kept in memory.
+        """
+        writer = _BodyWriter(spill_threshold, spill_dir)
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                writer.write(chunk)
+        except Exception:
+            writer.discard()
+            raise
+        finally:
+            response.close()
+        return writer.finish(response.encoding, timings, response.headers.get('Content-Type'))
+    
+    @classmethod
+    async def from_async_response(cls, response, spill_threshold: int = RESPONSE_SPILL_THRESHOLD,
+                                  spill_dir: str = RESPONSE_SPILL_DIR,
+                                  chunk_size: int = RESPONSE_CHUNK_SIZE,
+                                  timings: Optional[Dict[str, float]] = None) -> 'CapturedBody':
+        """Read a streamed httpx response like from_response() does"""
+        writer = _BodyWriter(spill_threshold, spill_dir)
+        try:
+            async for chunk in response.aiter_bytes(chunk_size):
+                writer.write(chunk)
+        except Exception:
+            writer.discard()
+            raise
+        finally:
+            await response.aclose()
+        return writer.finish(response.encoding, timings, response.headers.get('Content-Type'))
+    
+    @property
+    def spilled(self) -> bool:
+        """Whether the body was written to disk"""
+        return self.path is not None
+    
+    def read_bytes(self) -> bytes:
+        """Get the raw body bytes"""
+        if self._data is not None:
+            return self._data
+        with open(self.path, 'rb') as f:
+            return f.read()
+    
+    def text(self) -> str:
+        """Get the body decoded as text"""
+        return self.read_bytes().decode(self.encoding, errors='replace')
+    
+    def json(self) -> Any:
+        """
+        Parse the body as JSON (once), falling back to {"raw_response": text}
+        like execute_request always has
+        """
+        if self._is_json is None:
+            raw = self.read_bytes()
+            started = perf_counter()
+            try:
+                self._parsed = json.loads(raw)
+                self._is_json = True
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                self._parsed = {"raw_response": raw.decode(self.encoding, errors='replace')}
+                self._is_json = False
+            self.timings['parse'] = perf_counter() - started
+        return self._parsed
+    
+    @property
+    def declared_json(self) -> bool:
+        """Whether the server declared the body as UTF-8 JSON"""
+        media_type = (self.content_type or '').split(';')[0].strip().lower()
+        return ((media_type == 'application/json' or media_type.endswith('+json'))
+                and self.encoding.lower().replace('_', '-') in ('utf-8', 'utf8'))
+    
+    def storage_fields(self) -> Dict[str, Any]:
+        """
+        Get the fields to store the body under with save_test_results_bulk()
+        
+        A body declared as JSON is stored as received without being parsed
+        (a spilled one by its file, so it is never read into memory whole);
+        anything else is parsed, and wrapped like json() does if it is not
+        JSON.
+        """
+        fields = None
+        if self.declared_json and self._is_json is not False:
+            if self.spilled:
+                fields = {"response_file": self.path, "response_hash": self.sha256}
+            else:
+                try:
+                    fields = {"response_data": self.read_bytes().decode('utf-8')}
+                except UnicodeDecodeError:
+                    pass
+        
+        if fields is None:
+            self.json()
+            fields = {"response_data": json.dumps(self._parsed)}
+            if self._is_json:
+                try:
+                    fields = {"response_data": self.read_bytes().decode('utf-8')}
+                except UnicodeDecodeError:
+                    pass
+        return fields
+
+
+class _BodyWriter:
+    """Hashes body chunks and buffers them, spilling to disk past the threshold"""
+    
+    def __init__(self, spill_threshold: int, spill_dir: str):
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.buffer = []
+        self.spill_file = None
+    
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        
+        if self.spill_file is None and self.size > self.spill_threshold:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self.spill_file = tempfile.NamedTemporaryFile(dir=self.spill_dir, suffix='.body', delete=False)
+            self.spill_file.writelines(self.buffer)
+            self.buffer = []
+        
+        if self.spill_file is not None:
+            self.spill_file.write(chunk)
+        else:
+            self.buffer.append(chunk)
+    
+    def discard(self):
+        """Remove a partially spilled body"""
+        if self.spill_file is not None:
+            self.spill_file.close()
+            os.remove(self.spill_file.name)
+    
+    def finish(self, encoding: Optional[str], timings: Optional[Dict[str, float]],
+               content_type: Optional[str] = None) -> CapturedBody:
+        sha256 = self.digest.hexdigest()
+        if self.spill_file is None:
+            return CapturedBody(self.size, sha256, data=b''.join(self.buffer),
+                                encoding=encoding, timings=timings, content_type=content_type)
+        
+        # Each capture owns its file, even when another has the same content
+        self.spill_file.close()
+        return CapturedBody(self.size, sha256, path=self.spill_file.name, encoding=encoding,
+                            timings=timings, content_type=content_type)
+
+
+class ResponseResult(dict):
+    """
+    Result dictionary returned by execute_request
+    
+    The 'body' key is parsed from the captured bytes on first access, so
+    callers that only store or hash a response never pay for JSON parsing.
+    """
+    
+    def __init__(self, capture: CapturedBody, **fields):
+        super().__init__(
+            body_size=capture.size,
+            body_hash=capture.sha256,
+            capture=capture,
+            **fields
+        )
+    
+    def __missing__(self, key):
+        if key == 'body':
+            value = self['capture'].json()
+            self['body'] = value
+            return value
+        raise KeyError(key)
+
+
+def storage_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the fields to store an execute_request result's body under (see CapturedBody.storage_fields)"""
+    if result.get('capture') is not None:
+        return result['capture'].storage_fields()
+    return {"response_data": json.dumps(result['body'])}
+
+
+def parse_stored(text: str) -> Any:
+    """
+    Parse stored response_data
+    
+    Bodies declared as JSON are stored unparsed, so one that is not valid
+    JSON after all is wrapped like CapturedBody.json() does.
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return {"raw_response": text}
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def error_result(message: str, response_time: float) -> Dict[str, Any]:
+    """Build the result dictionary for a request that got no response"""
+    return {
+        "status_code": 0,
+        "body": {"error": message},
+        "response_time": response_time,
+        "headers": {},
+        "body_size": 0,
+        "body_hash": None,
+        "capture": None,
+        "timings": None
+    }
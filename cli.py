@@ -0,0 +1,424 @@
+"""
+Headless runner for API comparison suites
+
+Replays the stored test cases of one or more tasks against both the
+"Before Change" and "After Change" configurations, saves the results and
+exits non-zero when any case differs, so it can run in CI without Streamlit.
+
+    python cli.py run --task GetFlight_Comparison
+    python cli.py run --all --workers 32
+    python cli.py run --task GetFlight_Comparison --suite flights.jsonl
+    python cli.py import --task GetFlight_Comparison flights.yaml
+    python cli.py load --task GetFlight_Comparison --case ValidFlight --rps 50 --duration 30
+    python cli.py analyze --all
+    python cli.py schema --task GetFlight_Comparison
+    python cli.py run --task GetFlight_Comparison --record
+    python cli.py replay --task GetFlight_Comparison --port 9000
+    python cli.py shadow --task GetFlight_Comparison --port 8800 --sample 0.1
+"""
+
+import argparse
+import sys
+import threading
+from typing import List
+from api_manager import APIManager
+from database import Database
+from comparator import ResponseComparator
+from runner import PairedRunner
+from suites import iter_suite
+from regression import RegressionAnalyzer, REGRESSION, IMPROVEMENT, INSUFFICIENT_DATA
+from retry import RetryPolicy, HostRateLimiter
+from replay import ExchangeRecorder, ReplayStore, ReplayServer
+from shadow import ShadowProxy
+from dashboard import SuiteDashboard
+from config import (DATABASE_PATH, DEFAULT_TIMEOUT, BATCH_MAX_WORKERS, MAX_REQUESTS_PER_HOST,
+                    MAX_RETRIES, RETRY_METHODS, RATE_LIMIT_PER_HOST, RATE_LIMIT_BURST,
+                    BEFORE_VERSION, AFTER_VERSION, LOAD_DEFAULT_DURATION, LOAD_DEFAULT_CONCURRENCY,
+                    REPLAY_PORT, SHADOW_PORT, SHADOW_SAMPLE_RATE, SHADOW_QUEUE_SIZE, SHADOW_WORKERS)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="api-comparator", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DATABASE_PATH, help="Path to the SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    run = commands.add_parser("run", help="Run stored test cases against both versions and compare")
+    target = run.add_mutually_exclusive_group(required=True)
+    target.add_argument("--task", action="append", dest="tasks", metavar="NAME",
+                        help="Task to run (can be repeated)")
+    target.add_argument("--all", action="store_true", help="Run every task")
+    run.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS,
+                     help="Requests in flight (default: %(default)s)")
+    run.add_argument("--max-per-host", type=int, default=MAX_REQUESTS_PER_HOST,
+                     help="Requests in flight per host (default: %(default)s)")
+    run.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
+                     help="Request timeout in seconds (default: %(default)s)")
+    run.add_argument("--retries", type=int, default=MAX_RETRIES,
+                     help="Retries after a timeout, connection error or 429/5xx (default: %(default)s)")
+    run.add_argument("--retry-all-methods", action="store_true",
+                     help="Also retry POST, PUT and DELETE after a timeout or 5xx, which may repeat their effects")
+    run.add_argument("--rate-limit", type=float, default=RATE_LIMIT_PER_HOST, metavar="RPS",
+                     help="Requests per second sent to each host, 0 for no limit (default: %(default)s)")
+    run.add_argument("--suite", metavar="FILE",
+                     help="Run the cases of a suite file (.json, .jsonl, .yaml) instead of stored ones")
+    run.add_argument("--quiet", action="store_true", help="Only print failing cases and the summary")
+    run.add_argument("--check-latency", action="store_true",
+                     help="Also fail on statistically significant latency regressions over all stored runs")
+    mode = run.add_mutually_exclusive_group()
+    mode.add_argument("--record", action="store_true",
+                      help="Also save every raw request/response exchange for later replay")
+    mode.add_argument("--replay", action="store_true",
+                      help="Answer requests from recorded exchanges instead of calling the APIs")
+    
+    suite_import = commands.add_parser("import", help="Import suite files as the stored test cases of a task")
+    suite_import.add_argument("--task", required=True, metavar="NAME", help="Task to import the cases into")
+    suite_import.add_argument("--replace", action="store_true", help="Delete the task's imported cases first")
+    suite_import.add_argument("files", nargs="+", metavar="FILE", help="Suite files (.json, .jsonl, .yaml)")
+    
+    load = commands.add_parser("load", help="Load both versions with one stored test case and compare latency")
+    load.add_argument("--task", required=True, metavar="NAME", help="Task to load")
+    load.add_argument("--case", required=True, metavar="NAME", help="Stored test case to send")
+    load.add_argument("--duration", type=float, default=LOAD_DEFAULT_DURATION,
+                      help="Seconds to run (default: %(default)s)")
+    level = load.add_mutually_exclusive_group()
+    level.add_argument("--rps", type=float, help="Target requests per second per version")
+    level.add_argument("--concurrency", type=int, default=LOAD_DEFAULT_CONCURRENCY,
+                       help="Concurrent requests per version (default: %(default)s)")
+    load.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
+                      help="Request timeout in seconds (default: %(default)s)")
+    
+    analyze = commands.add_parser("analyze", help="Test stored latencies of both versions for regressions")
+    scope = analyze.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--task", action="append", dest="tasks", metavar="NAME",
+                       help="Task to analyze (can be repeated)")
+    scope.add_argument("--all", action="store_true", help="Analyze every task")
+    analyze.add_argument("--quiet", action="store_true", help="Only print regressions and the summary")
+    
+    schema = commands.add_parser("schema", help="Compare the response schemas of both versions")
+    scope = schema.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--task", action="append", dest="tasks", metavar="NAME",
+                       help="Task to check (can be repeated)")
+    scope.add_argument("--all", action="store_true", help="Check every task")
+    schema.add_argument("--rebuild", action="store_true",
+                        help="Rebuild the schemas from all stored results first")
+    
+    replay = commands.add_parser("replay", help="Serve the recorded exchanges of both versions over HTTP")
+    replay.add_argument("--task", required=True, metavar="NAME", help="Task whose recordings to serve")
+    replay.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: %(default)s)")
+    replay.add_argument("--port", type=int, default=REPLAY_PORT,
+                        help="Port for \"Before Change\"; \"After Change\" gets the next (default: %(default)s)")
+    
+    shadow = commands.add_parser("shadow", help="Proxy traffic to \"Before Change\" and mirror it to \"After Change\"")
+    shadow.add_argument("--task", required=True, metavar="NAME", help="Task whose versions to compare")
+    shadow.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: %(default)s)")
+    shadow.add_argument("--port", type=int, default=SHADOW_PORT, help="Port to listen on (default: %(default)s)")
+    shadow.add_argument("--sample", type=float, default=SHADOW_SAMPLE_RATE, metavar="RATE",
+                        help="Share of requests mirrored, 0 to 1 (default: %(default)s)")
+    shadow.add_argument("--queue-size", type=int, default=SHADOW_QUEUE_SIZE,
+                        help="Mirrors that may wait before more are dropped (default: %(default)s)")
+    shadow.add_argument("--workers", type=int, default=SHADOW_WORKERS,
+                        help="Threads sending mirrors and comparing (default: %(default)s)")
+    shadow.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
+                        help="Request timeout in seconds (default: %(default)s)")
+    return parser
+
+
+def run_tasks(runner: PairedRunner, tasks: List[str], workers: int, max_per_host: int,
+              quiet: bool = False, suite: str = None, strict: bool = False) -> int:
+    """
+    Run every stored test case of the given tasks
+    
+    With strict, a task that cannot run (unknown, or missing a version)
+    counts as a failure instead of being skipped, as when the user named it.
+    
+    Returns:
+        Number of failed cases (different responses, status codes or request
+        errors) plus, with strict, the number of tasks that could not run
+    """
+    total = failed = unrunnable = 0
+    for task_name in tasks:
+        before_config, after_config = runner.get_config_pair(task_name)
+        if not before_config or not after_config:
+            reason = "needs both versions configured" if before_config or after_config else "unknown task"
+            if strict:
+                unrunnable += 1
+                print(f"[FAIL] {task_name}: {reason}", file=sys.stderr)
+            else:
+                print(f"[skip] {task_name}: {reason}", file=sys.stderr)
+            continue
+        
+        cases = iter_suite(suite) if suite else runner.get_stored_cases(task_name)
+        results = runner.run_suite(task_name, cases, workers, max_per_host)
+        for result in results:
+            total += 1
+            before, after = result['before'], result['after']
+            comparison = result['comparison']
+            
+            problems = []
+            if before['status_code'] == 0 or after['status_code'] == 0:
+                problems.append("request error")
+            if before['status_code'] != after['status_code']:
+                problems.append(f"status {before['status_code']} -> {after['status_code']}")
+            if not comparison['identical']:
+                problems.append(comparison['summary'].lower())
+            
+            if problems:
+                failed += 1
+                print(f"[FAIL] {task_name} / {result['test_case_name']}: {', '.join(problems)}")
+            elif not quiet:
+                print(f"[ ok ] {task_name} / {result['test_case_name']}")
+    
+    print(f"\n{total} case(s) run, {total - failed} passed, {failed} failed")
+    if unrunnable:
+        print(f"{unrunnable} task(s) could not run", file=sys.stderr)
+    return failed + unrunnable
+
+
+def import_suites(db: Database, task_name: str, files: List[str], replace: bool = False) -> int:
+    """
+    Import suite files into a task's test cases, returning the number imported
+    
+    With replace, the files are imported in one transaction with the
+    delete, so a file that fails to import leaves the previous cases.
+    """
+    counts = []
+    
+    def cases():
+        for path in files:
+            counts.append(0)
+            for case in iter_suite(path):
+                counts[-1] += 1
+                yield case
+    
+    total = db.import_test_cases(task_name, cases(), replace=replace)
+    for path, imported in zip(files, counts):
+        print(f"Imported {imported} case(s) from {path}")
+    return total
+
+
+def run_load(runner: PairedRunner, task_name: str, case_name: str, duration: float,
+             rate: float = None, concurrency: int = None) -> int:
+    """Load both versions with a stored test case and print their latency percentiles"""
+    case = next((c for c in runner.get_stored_cases(task_name) if c['name'] == case_name), None)
+    if case is None:
+        print(f"Error: no stored test case '{case_name}' in task '{task_name}'", file=sys.stderr)
+        return 2
+    
+    level = f"{rate:g} req/s" if rate is not None else f"{concurrency} concurrent"
+    print(f"Loading {task_name} / {case_name} for {duration:g}s at {level} per version...")
+    run = runner.run_load(task_name, case_name, case['payload'], case['query_params'],
+                          duration=duration, rate=rate, concurrency=None if rate is not None else concurrency)
+    
+    print(f"\n{'':16}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for version in (BEFORE_VERSION, AFTER_VERSION):
+        s = run[version].summary()
+        print(f"{version:16}{s['requests']:>10}{s['errors']:>8}{s['throughput']:>9.1f}"
+              f"{s['p50'] * 1000:>9.1f}{s['p90'] * 1000:>9.1f}{s['p99'] * 1000:>9.1f}{s['max'] * 1000:>9.1f}")
+        if s['dropped']:
+            print(f"{'':16}{s['dropped']} request(s) not sent: the target rate outran the worker pool")
+    return 0
+
+
+def serve_replay(db: Database, task_name: str, host: str, port: int) -> int:
+    """Serve the recordings of a task's two configurations until interrupted"""
+    configs = {c['api_version']: c for c in db.get_configs_by_task(task_name)}
+    if BEFORE_VERSION not in configs or AFTER_VERSION not in configs:
+        print(f"Error: task '{task_name}' needs both a '{BEFORE_VERSION}' and an '{AFTER_VERSION}' configuration",
+              file=sys.stderr)
+        return 2
+    
+    store = ReplayStore(db)
+    servers = []
+    for offset, version in enumerate((BEFORE_VERSION, AFTER_VERSION)):
+        config = configs[version]
+        loaded = store.preload(config['id'])
+        server = ReplayServer(store, config, host, port + offset)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        print(f"{version}: {server.url} replays {loaded} exchange(s) recorded from {server.upstream}")
+    
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+    return 0
+
+
+def run_shadow(runner: PairedRunner, task_name: str, host: str, port: int, sample_rate: float,
+               queue_size: int, workers: int, interval: float = 10.0) -> int:
+    """Proxy and mirror traffic until interrupted, printing counters every interval seconds"""
+    proxy = ShadowProxy(runner, task_name, host, port, sample_rate, queue_size, workers)
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+    print(f"Proxying {proxy.url} to {proxy.before_config['api_url']}, mirroring "
+          f"{sample_rate:.0%} to {proxy.after_config['api_url']}")
+    
+    def report():
+        s = proxy.stats()
+        print(f"{s['proxied']} proxied, {s['compared']} compared, {s['different']} different, "
+              f"{s['dropped']} dropped, {s['failed']} failed, {s['unsaved']} unsaved, {s['queued']} queued")
+    
+    stopped = threading.Event()
+    try:
+        while not stopped.wait(interval):
+            report()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.shutdown()
+        # Finishes the queued mirrors before returning
+        proxy.server_close()
+        report()
+    return 0
+
+
+def analyze_tasks(analyzer: RegressionAnalyzer, tasks: List[str], quiet: bool = False) -> int:
+    """
+    Test the stored latencies of every test case of the given tasks
+    
+    Returns:
+        Number of test cases with a latency regression
+    """
+    regressions = analyzed = 0
+    for task_name in tasks:
+        for result in analyzer.analyze_task(task_name):
+            if result.verdict == INSUFFICIENT_DATA:
+                if not quiet:
+                    print(f"[ -- ] {task_name} / {result.test_case_name}: insufficient data "
+                          f"({result.before_samples} before, {result.after_samples} after)")
+                continue
+            analyzed += 1
+            line = (f"{task_name} / {result.test_case_name}: median "
+                    f"{result.before_median * 1000:.1f} -> {result.after_median * 1000:.1f} ms "
+                    f"({result.change:+.1%}, 95% CI {result.ci_low:+.1%} to {result.ci_high:+.1%}, "
+                    f"p={result.p_value:.3g}, n={result.before_samples}/{result.after_samples})")
+            if result.verdict == REGRESSION:
+                regressions += 1
+                print(f"[SLOW] {line}")
+            elif not quiet:
+                print(f"[{'FAST' if result.verdict == IMPROVEMENT else ' ok '}] {line}")
+    
+    print(f"\n{analyzed} case(s) analyzed, {regressions} latency regression(s)")
+    return regressions
+
+
+def check_schemas(dashboard: SuiteDashboard, tasks: List[str]) -> int:
+    """
+    Print the schema drift between the versions of the given tasks
+    
+    Returns:
+        Number of tasks whose response schema changed
+    """
+    drifted = 0
+    for task_name in tasks:
+        drift = dashboard.schema_drift(task_name)
+        if drift is None:
+            print(f"[ -- ] {task_name}: no successful responses from both versions yet")
+            continue
+        if drift['identical']:
+            print(f"[ ok ] {task_name}: response schema unchanged")
+            continue
+        
+        drifted += 1
+        print(f"[DRIFT] {task_name}")
+        for path in drift['added']:
+            print(f"    + {path}")
+        for path in drift['removed']:
+            print(f"    - {path}")
+        for path, change in drift['type_changes'].items():
+            print(f"    ~ {path}: {'|'.join(change['before'])} -> {'|'.join(change['after'])}")
+        for path, change in drift['optionality_changes'].items():
+            print(f"    ? {path}: {change['before']} -> {change['after']}")
+    
+    print(f"\n{len(tasks)} task(s) checked, {drifted} with schema drift")
+    return drifted
+
+
+def main(argv: List[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "run" and args.suite and (args.all or len(args.tasks) > 1):
+        parser.error("--suite needs exactly one --task")
+    
+    db = Database(args.db)
+    try:
+        if args.command == "import":
+            try:
+                import_suites(db, args.task, args.files, args.replace)
+            except (OSError, ValueError, ImportError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 2
+            return 0
+        
+        if args.command == "analyze":
+            tasks = db.get_all_tasks() if args.all else args.tasks
+            return 1 if analyze_tasks(RegressionAnalyzer(db), tasks, args.quiet) else 0
+        
+        if args.command == "schema":
+            tasks = db.get_all_tasks() if args.all else args.tasks
+            if args.rebuild:
+                db.rebuild_response_schemas(
+                    config['id'] for task_name in tasks for config in db.get_configs_by_task(task_name)
+                )
+            return 1 if check_schemas(SuiteDashboard(db, ResponseComparator(store=db)), tasks) else 0
+        
+        if args.command == "replay":
+            return serve_replay(db, args.task, args.host, args.port)
+        
+        if args.command == "shadow":
+            runner = PairedRunner(db, APIManager(timeout=args.timeout), ResponseComparator(store=db))
+            try:
+                return run_shadow(runner, args.task, args.host, args.port, args.sample,
+                                  args.queue_size, args.workers)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 2
+        
+        if args.command == "load":
+            runner = PairedRunner(db, APIManager(timeout=args.timeout), ResponseComparator(store=db))
+            try:
+                return run_load(runner, args.task, args.case, args.duration, args.rps, args.concurrency)
+            except ValueError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 2
+        
+        recorder = ExchangeRecorder(db) if args.record else None
+        runner = PairedRunner(
+            db,
+            APIManager(
+                timeout=args.timeout,
+                max_workers=args.workers,
+                max_per_host=args.max_per_host,
+                retry_policy=RetryPolicy(
+                    max_retries=0 if args.replay else args.retries,
+                    methods=("GET", "HEAD", "OPTIONS", "POST", "PUT", "DELETE", "PATCH")
+                    if args.retry_all_methods else RETRY_METHODS
+                ),
+                rate_limiter=HostRateLimiter(0 if args.replay else args.rate_limit, RATE_LIMIT_BURST),
+                recorder=recorder,
+                replay=ReplayStore(db) if args.replay else None
+            ),
+            ResponseComparator(store=db)
+        )
+        tasks = db.get_all_tasks() if args.all else args.tasks
+        try:
+            failed = run_tasks(runner, tasks, args.workers, args.max_per_host, args.quiet, args.suite,
+                               strict=not args.all)
+            if args.check_latency:
+                failed += analyze_tasks(RegressionAnalyzer(db), tasks, args.quiet)
+        except (OSError, ValueError, ImportError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+        finally:
+            if recorder is not None:
+                recorder.close()
+    finally:
+        db.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
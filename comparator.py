@@ -1,31 +1,667 @@
 import json
-from typing import Dict, Any, List, Tuple
-from deepdiff import DeepDiff
+import threading
+from collections import OrderedDict, defaultdict, deque
+from functools import lru_cache
+from hashlib import blake2b
+from difflib import SequenceMatcher
+from itertools import islice
+from typing import Dict, Any, List, Tuple, Optional, Iterable, Iterator, NamedTuple, Callable, Union
+from rules import ComparisonRules, _is_number
+from schema import ROOT_PATH, infer_schema, flatten_schema, diff_schemas
+from config import (COMPARATOR_BACKEND, MAX_DIFFERENCES, COMPARATOR_TREE_CACHE_SIZE, SIMILARITY_ALIGN_LIMIT,
+                    COMPARATOR_LEAF_CACHE_MAX_LENGTH)
+
+class MerkleNode:
+    """Structural hash of a JSON value, with the hashes of its children for containers"""
+    
+    __slots__ = ('digest', 'value', 'children', 'size')
+    
+    def __init__(self, digest: bytes, value: Any, children=None, size: int = 1):
+        self.digest = digest
+        self.value = value
+        # Dict of key -> node for objects, list of nodes for arrays, None for scalars
+        self.children = children
+        # Number of nodes in this subtree, including itself
+        self.size = size
+
+
+def _hash_leaf(value: Any) -> bytes:
+    """Hash a scalar, tagging its JSON type so 1, 1.0, True and "1" all differ"""
+    if value is None:
+        data = b'n'
+    elif isinstance(value, bool):
+        data = b't' if value else b'f'
+    elif isinstance(value, int):
+        data = b'i' + str(value).encode()
+    elif isinstance(value, float):
+        data = b'd' + repr(value).encode()
+    elif isinstance(value, str):
+        data = b's' + value.encode('utf-8', 'surrogatepass')
+    else:
+        data = b'o' + type(value).__name__.encode() + b':' + repr(value).encode('utf-8', 'surrogatepass')
+    return blake2b(data, digest_size=16).digest()
+
+
+_cached_leaf_digest = lru_cache(maxsize=65536, typed=True)(_hash_leaf)
+
+
+def _leaf_digest(value: Any) -> bytes:
+    """Hash a scalar, caching short strings and numbers, which repeat across responses"""
+    if isinstance(value, str):
+        if len(value) > COMPARATOR_LEAF_CACHE_MAX_LENGTH:
+            # Caching would keep long strings alive for the life of the process
+            return _hash_leaf(value)
+    elif value is not None and not isinstance(value, (bool, int, float)):
+        return _hash_leaf(value)
+    return _cached_leaf_digest(value)
+
+
+def build_merkle_tree(obj: Any) -> MerkleNode:
+    """
+    Hash a parsed JSON value bottom-up
+    
+    Object hashes do not depend on key order, so two values have equal root
+    digests exactly when they are structurally identical.
+    """
+    if isinstance(obj, dict):
+        children = {key: build_merkle_tree(value) for key, value in obj.items()}
+        h = blake2b(b'{', digest_size=16)
+        size = 1
+        for key in sorted(children, key=str):
+            child = children[key]
+            h.update(_leaf_digest(key))
+            h.update(child.digest)
+            size += child.size
+        return MerkleNode(h.digest(), obj, children, size)
+    if isinstance(obj, (list, tuple)):
+        children = [build_merkle_tree(value) for value in obj]
+        h = blake2b(b'[', digest_size=16)
+        size = 1
+        for child in children:
+            h.update(child.digest)
+            size += child.size
+        return MerkleNode(h.digest(), obj, children, size)
+    return MerkleNode(_leaf_digest(obj), obj)
+
+
+def structural_hash(obj: Any) -> str:
+    """Get the hex root digest of a parsed JSON value"""
+    return build_merkle_tree(obj).digest.hex()
+
+
+def _child_path(path: str, key: Any) -> str:
+    """Append a key or index to a DeepDiff-style path"""
+    return f"{path}[{key!r}]"
+
+
+class Difference(NamedTuple):
+    """A single difference, named after the DeepDiff report it belongs to"""
+    report: str
+    path: str
+    old_value: Any
+    new_value: Any
+
+
+def _masked(rules: Optional[ComparisonRules], state, step: Any) -> bool:
+    """Whether a child key or index is pruned by an ignore rule"""
+    return rules is not None and rules.ignored(rules.step(state, step))
+
+
+def iter_differences(node1: MerkleNode, node2: MerkleNode, path: str = "root",
+                     rules: Optional[ComparisonRules] = None, state=None) -> Iterator[Difference]:
+    """
+    Yield the differences between two Merkle trees
+    
+    Only children whose digests differ are visited, so identical parts of
+    large responses are skipped without being compared value by value.
+    Differences are produced lazily; stop iterating to stop the walk.
+    
+    Args:
+        node1, node2: Trees to compare
+        path: DeepDiff-style path of the two nodes
+        rules: Optional compiled per-path rules (list modes, masks, tolerances)
+        state: Rule matcher state at this path (defaults to the rules' start)
+    """
+    if node1.digest == node2.digest:
+        return
+    if rules is not None and state is None:
+        state = rules.start
+        if rules.ignored(state):
+            return
+    
+    value1, value2 = node1.value, node2.value
+    
+    if isinstance(value1, dict) and isinstance(value2, dict):
+        children1, children2 = node1.children, node2.children
+        for key, child1 in children1.items():
+            child2 = children2.get(key)
+            if child2 is not None and child1.digest == child2.digest:
+                continue
+            child_state = None
+            if rules is not None:
+                child_state = rules.step(state, key)
+                if rules.ignored(child_state):
+                    continue
+            if child2 is None:
+                yield Difference('dictionary_item_removed', _child_path(path, key), child1.value, None)
+            else:
+                yield from iter_differences(child1, child2, _child_path(path, key), rules, child_state)
+        for key, child2 in children2.items():
+            if key not in children1 and not _masked(rules, state, key):
+                yield Difference('dictionary_item_added', _child_path(path, key), None, child2.value)
+    
+    elif isinstance(value1, list) and isinstance(value2, list):
+        mode, field = rules.list_mode(state) if rules is not None else ('ordered', None)
+        if mode == 'unordered':
+            yield from _iter_unordered_differences(
+                list(enumerate(node1.children)), list(enumerate(node2.children)), path, rules, state
+            )
+        elif mode == 'keyed':
+            yield from _iter_keyed_differences(node1.children, node2.children, field, path, rules, state)
+        else:
+            yield from _iter_list_differences(node1.children, node2.children, path, rules, state)
+    
+    elif rules is not None and rules.scalars_equal(state, value1, value2):
+        return
+    
+    elif type(value1) is not type(value2):
+        yield Difference('type_changes', path, value1, value2)
+    
+    else:
+        yield Difference('values_changed', path, value1, value2)
+
+
+def _iter_pair(child1: MerkleNode, child2: MerkleNode, index: int, path: str,
+               rules: Optional[ComparisonRules], state) -> Iterator[Difference]:
+    """Compare two array items, reporting them under the before-change index"""
+    child_state = None
+    if rules is not None:
+        child_state = rules.step(state, index)
+        if rules.ignored(child_state):
+            return iter(())
+    return iter_differences(child1, child2, _child_path(path, index), rules, child_state)
+
+
+# Stands for every number under a tolerance, so items differing only within it share a digest
+_TOLERATED_DIGEST = blake2b(b'~number', digest_size=16).digest()
+
+
+def _rules_digest(node: MerkleNode, rules: ComparisonRules, state) -> bytes:
+    """
+    Digest of a node as the rules see it
+    
+    Ignored subtrees are left out, normalized strings are hashed after
+    normalizing, numbers under a tolerance are hashed by type only and
+    unordered or keyed lists ignore item order. Nodes equal under the rules
+    therefore share a digest; with tolerances, nodes sharing a digest may
+    still differ and must be compared.
+    """
+    if not state:
+        # No rule applies anywhere below
+        return node.digest
+    node_rules = rules.at(state)
+    children = node.children
+    if isinstance(children, dict):
+        h = blake2b(b'{', digest_size=16)
+        for key in sorted(children, key=str):
+            child_state = rules.step(state, key)
+            if rules.ignored(child_state):
+                continue
+            h.update(_leaf_digest(key))
+            h.update(_rules_digest(children[key], rules, child_state))
+        return h.digest()
+    if isinstance(children, list):
+        digests = []
+        for index, child in enumerate(children):
+            child_state = rules.step(state, index)
+            if not rules.ignored(child_state):
+                digests.append(_rules_digest(child, rules, child_state))
+        if node_rules.list_mode[0] != 'ordered':
+            digests.sort()
+        h = blake2b(b'[', digest_size=16)
+        for digest in digests:
+            h.update(digest)
+        return h.digest()
+    
+    value = node.value
+    if node_rules.tolerance and _is_number(value):
+        return _TOLERATED_DIGEST
+    if node_rules.normalizers and isinstance(value, str):
+        for regex, replacement in node_rules.normalizers:
+            value = regex.sub(replacement, value)
+        return _leaf_digest(value)
+    return node.digest
+
+
+def _match_keys(items: List[Tuple[int, MerkleNode]], rules: Optional[ComparisonRules], state) -> List[bytes]:
+    """Get the digests to match list items on: raw, or as the rules see them"""
+    if rules is None or rules.empty:
+        return [child.digest for _, child in items]
+    return [_rules_digest(child, rules, rules.step(state, index)) for index, child in items]
+
+
+def _equal_under_rules(child1: MerkleNode, child2: MerkleNode, index: int, path: str,
+                       rules: Optional[ComparisonRules], state) -> bool:
+    if child1.digest == child2.digest:
+        return True
+    return next(_iter_pair(child1, child2, index, path, rules, state), None) is None
+
+
+def _removed(child: MerkleNode, index: int, path: str, rules: Optional[ComparisonRules], state):
+    """Report an array item only present before the change, unless it is masked"""
+    if not _masked(rules, state, index):
+        yield Difference('iterable_item_removed', _child_path(path, index), child.value, None)
+
+
+def _added(child: MerkleNode, index: int, path: str, rules: Optional[ComparisonRules], state):
+    """Report an array item only present after the change, unless it is masked"""
+    if not _masked(rules, state, index):
+        yield Difference('iterable_item_added', _child_path(path, index), None, child.value)
+
+
+def _iter_list_differences(children1: List[MerkleNode], children2: List[MerkleNode], path: str,
+                           rules: Optional[ComparisonRules] = None, state=None) -> Iterator[Difference]:
+    """
+    Yield the differences between two ordered lists of Merkle nodes
+    
+    Lists of different lengths are aligned on the items' digests as the
+    rules see them, so masked or tolerated changes do not break alignment.
+    Aligned items whose raw digests differ are still compared.
+    """
+    if len(children1) == len(children2):
+        for index, (child1, child2) in enumerate(zip(children1, children2)):
+            if child1.digest != child2.digest:
+                yield from _iter_pair(child1, child2, index, path, rules, state)
+        return
+    
+    keys1 = _match_keys(list(enumerate(children1)), rules, state)
+    keys2 = _match_keys(list(enumerate(children2)), rules, state)
+    
+    # Skip the common prefix and suffix so only the changed middle is aligned
+    start = 0
+    end1, end2 = len(children1), len(children2)
+    while start < end1 and start < end2 and keys1[start] == keys2[start]:
+        start += 1
+    while end1 > start and end2 > start and keys1[end1 - 1] == keys2[end2 - 1]:
+        end1 -= 1
+        end2 -= 1
+    
+    opcodes = [('equal', 0, start, 0, start)]
+    matcher = SequenceMatcher(None, keys1[start:end1], keys2[start:end2], autojunk=False)
+    opcodes += [
+        (tag, i1 + start, i2 + start, j1 + start, j2 + start)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+    ]
+    opcodes.append(('equal', end1, len(children1), end2, len(children2)))
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            for offset in range(i2 - i1):
+                child1, child2 = children1[i1 + offset], children2[j1 + offset]
+                if child1.digest != child2.digest:
+                    yield from _iter_pair(child1, child2, i1 + offset, path, rules, state)
+            continue
+        if tag == 'replace':
+            # Compare replaced items pairwise; the longer side's extra items are added/removed
+            paired = min(i2 - i1, j2 - j1)
+            for offset in range(paired):
+                yield from _iter_pair(children1[i1 + offset], children2[j1 + offset], i1 + offset, path, rules, state)
+            i1 += paired
+            j1 += paired
+        for index in range(i1, i2):
+            yield from _removed(children1[index], index, path, rules, state)
+        for index in range(j1, j2):
+            yield from _added(children2[index], index, path, rules, state)
+
+
+def _iter_unordered_differences(items1: List[Tuple[int, MerkleNode]], items2: List[Tuple[int, MerkleNode]],
+                                path: str, rules: Optional[ComparisonRules] = None,
+                                state=None) -> Iterator[Difference]:
+    """
+    Yield the differences between two lists compared as multisets
+    
+    Items are matched by digest in linear time, using digests as the rules
+    see them so masked, normalized or tolerated differences do not stop a
+    match. Candidates that share a digest only because of a tolerance are
+    compared before being matched. Whatever is left over on either side is
+    reported as removed or added.
+    """
+    exact = rules is None or rules.empty
+    unmatched = defaultdict(deque)
+    for key, item in zip(_match_keys(items2, rules, state), items2):
+        unmatched[key].append(item)
+    
+    for key, (index, child) in zip(_match_keys(items1, rules, state), items1):
+        candidates = unmatched.get(key)
+        if candidates and exact:
+            candidates.popleft()
+            continue
+        match = next(
+            (position for position, (_, candidate) in enumerate(candidates or ())
+             if _equal_under_rules(child, candidate, index, path, rules, state)),
+            None
+        )
+        if match is not None:
+            del candidates[match]
+        else:
+            yield from _removed(child, index, path, rules, state)
+    
+    added = sorted(item for candidates in unmatched.values() for item in candidates)
+    for index, child in added:
+        yield from _added(child, index, path, rules, state)
+
+
+def _iter_keyed_differences(children1: List[MerkleNode], children2: List[MerkleNode], field: str,
+                            path: str, rules: Optional[ComparisonRules] = None,
+                            state=None) -> Iterator[Difference]:
+    """
+    Yield the differences between two lists of objects aligned by a key field
+    
+    Items sharing the same key value are compared with each other, whatever
+    their positions. Items without the field are compared as a multiset.
+    """
+    def key_of(child: MerkleNode):
+        if isinstance(child.children, dict):
+            key_node = child.children.get(field)
+            if key_node is not None:
+                return key_node.digest
+        return None
+    
+    keyed2 = defaultdict(deque)
+    loose2 = []
+    for index, child in enumerate(children2):
+        key = key_of(child)
+        if key is None:
+            loose2.append((index, child))
+        else:
+            keyed2[key].append((index, child))
+    
+    loose1 = []
+    for index, child1 in enumerate(children1):
+        key = key_of(child1)
+        candidates = keyed2.get(key) if key is not None else None
+        if key is None:
+            loose1.append((index, child1))
+        elif candidates:
+            _, child2 = candidates.popleft()
+            if child1.digest != child2.digest:
+                yield from _iter_pair(child1, child2, index, path, rules, state)
+        else:
+            yield from _removed(child1, index, path, rules, state)
+    
+    added = sorted(item for candidates in keyed2.values() for item in candidates)
+    for index, child2 in added:
+        yield from _added(child2, index, path, rules, state)
+    
+    if loose1 or loose2:
+        yield from _iter_unordered_differences(loose1, loose2, path, rules, state)
+
+
+def _matched_size(node1: MerkleNode, node2: MerkleNode, align_limit: int) -> int:
+    """
+    Count the nodes two trees have in common
+    
+    Identical subtrees count in full without being visited. Objects match
+    key by key. Arrays are aligned on child digests, falling back to
+    positional pairing when the changed middle is larger than align_limit
+    (the product of both lengths), which bounds the cost on huge arrays.
+    """
+    if node1.digest == node2.digest:
+        return node1.size
+    
+    children1, children2 = node1.children, node2.children
+    if isinstance(children1, dict) and isinstance(children2, dict):
+        matched = 1
+        for key, child1 in children1.items():
+            child2 = children2.get(key)
+            if child2 is not None:
+                matched += _matched_size(child1, child2, align_limit)
+        return matched
+    
+    if isinstance(children1, list) and isinstance(children2, list):
+        matched = 1
+        start = 0
+        end1, end2 = len(children1), len(children2)
+        while start < end1 and start < end2 and children1[start].digest == children2[start].digest:
+            matched += children1[start].size
+            start += 1
+        while end1 > start and end2 > start and children1[end1 - 1].digest == children2[end2 - 1].digest:
+            matched += children1[end1 - 1].size
+            end1 -= 1
+            end2 -= 1
+        
+        middle1, middle2 = children1[start:end1], children2[start:end2]
+        if len(middle1) * len(middle2) > align_limit:
+            pairs = [(middle1, middle2)]
+        else:
+            pairs = []
+            matcher = SequenceMatcher(
+                None,
+                [child.digest for child in middle1],
+                [child.digest for child in middle2],
+                autojunk=False
+            )
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == 'equal':
+                    matched += sum(child.size for child in middle1[i1:i2])
+                elif tag == 'replace':
+                    pairs.append((middle1[i1:i2], middle2[j1:j2]))
+        for block1, block2 in pairs:
+            for child1, child2 in zip(block1, block2):
+                matched += _matched_size(child1, child2, align_limit)
+        return matched
+    
+    # Scalars that differ, or a type change
+    return 0
+
+
+def _group_differences(differences: Iterable[Difference]) -> Dict[str, Dict[str, Any]]:
+    """Group differences into a DeepDiff-style report dictionary"""
+    diff = {}
+    for d in differences:
+        if d.report == 'values_changed':
+            item = {'new_value': d.new_value, 'old_value': d.old_value}
+        elif d.report == 'type_changes':
+            item = {
+                'old_type': type(d.old_value),
+                'new_type': type(d.new_value),
+                'old_value': d.old_value,
+                'new_value': d.new_value
+            }
+        elif d.report.endswith('_added'):
+            item = d.new_value
+        else:
+            item = d.old_value
+        diff.setdefault(d.report, {})[d.path] = item
+    return diff
+
+
+# A response, or a function returning it so that a pair found in the store is never loaded
+LazyResponse = Union[Any, Callable[[], Any]]
+
+
+def _load(response: LazyResponse) -> Any:
+    return response() if callable(response) else response
+
 
 class ResponseComparator:
-    def compare_responses(self, response1: Dict, response2: Dict) -> Dict[str, Any]:
+    BACKENDS = ("native", "deepdiff")
+    # Bump whenever a change to the native engine changes its results, so stored ones are not reused
+    ENGINE_VERSION = 1
+    
+    def __init__(self, backend: str = COMPARATOR_BACKEND, max_differences: Optional[int] = MAX_DIFFERENCES,
+                 store=None):
+        """
+        Args:
+            backend: "native" for the built-in diff engine, "deepdiff" for DeepDiff
+                (kept for parity checks)
+            max_differences: Stop the native engine after this many differences
+                (None for no limit)
+            store: Optional Database persisting native results by the hashes of
+                both responses and the comparison settings, so an unchanged pair
+                is only ever diffed once
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown comparator backend: {backend}")
+        self.backend = backend
+        self.max_differences = max_differences
+        self.store = store
+        
+        # Merkle trees of stored responses, keyed by their response hash
+        self._tree_cache: "OrderedDict[str, MerkleNode]" = OrderedDict()
+        self._tree_cache_lock = threading.Lock()
+    
+    def get_tree(self, response: Any, key: Optional[str] = None) -> MerkleNode:
+        """
+        Build the Merkle tree of a response, reusing it when the same key is seen again
+        
+        Args:
+            response: Parsed response
+            key: Stable identifier of the response content, such as its
+                response_hash; without one the tree is not cached
+        """
+        if key is None:
+            return build_merkle_tree(response)
+        
+        with self._tree_cache_lock:
+            tree = self._tree_cache.get(key)
+            if tree is not None:
+                self._tree_cache.move_to_end(key)
+                return tree
+        
+        tree = build_merkle_tree(response)
+        with self._tree_cache_lock:
+            self._tree_cache[key] = tree
+            while len(self._tree_cache) > COMPARATOR_TREE_CACHE_SIZE:
+                self._tree_cache.popitem(last=False)
+        return tree
+    
+    def iter_differences(self, response1: Any, response2: Any,
+                         key1: Optional[str] = None, key2: Optional[str] = None,
+                         rules: Optional[ComparisonRules] = None) -> Iterator[Difference]:
+        """Yield the differences between two responses using the native engine"""
+        return iter_differences(self.get_tree(response1, key1), self.get_tree(response2, key2), rules=rules)
+    
+    def fingerprint(self, rules: Optional[ComparisonRules] = None, backend: Optional[str] = None,
+                    max_differences: Optional[int] = None) -> str:
+        """Hash of everything besides the two responses that a comparison result depends on"""
+        settings = {
+            "engine": self.ENGINE_VERSION,
+            "backend": backend or self.backend,
+            "max_differences": max_differences if max_differences is not None else self.max_differences,
+            "rules": rules.fingerprint if rules is not None else None
+        }
+        return blake2b(json.dumps(settings, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+    
+    def compare_responses(self, response1: LazyResponse, response2: LazyResponse, backend: Optional[str] = None,
+                          max_differences: Optional[int] = None,
+                          key1: Optional[str] = None, key2: Optional[str] = None,
+                          rules: Optional[ComparisonRules] = None) -> Dict[str, Any]:
         """
         Compare two JSON responses and identify differences
         
         Args:
-            response1: First response (before change)
-            response2: Second response (after change)
+            response1: First response (before change), or a function returning it
+            response2: Second response (after change), or a function returning it
+            backend: Overrides the comparator's backend for this call
+            max_differences: Overrides the comparator's difference limit for this call
+            key1, key2: Optional content keys (e.g. response_hash) for reusing cached
+                trees and, with a store, stored results
+            rules: Compiled per-task rules: list modes, ignored paths, tolerances and
+                normalizers (native backend only)
+        
+        Returns:
+            Dictionary with 'identical', 'differences' (messages) and 'summary';
+            when not identical also 'truncated' and 'detailed_diff', whose
+            type_changes hold 'old_type'/'new_type' as Python types. Results
+            read back from a store have the same shape.
+        """
+        backend = backend or self.backend
+        if self.store is not None and backend == self.backend == "native" and key1 and key2:
+            return self.compare_many([(response1, response2, key1, key2, rules)], max_differences)[0]
+        return self._compare(_load(response1), _load(response2), backend, max_differences, key1, key2, rules)
+    
+    def compare_many(self, pairs: Iterable[Tuple[LazyResponse, LazyResponse, Optional[str], Optional[str],
+                                                 Optional[ComparisonRules]]],
+                     max_differences: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Compare many pairs, reusing stored results and storing new ones in one go
+        
+        Pairs with both keys are looked up in the store with a single query,
+        and only the ones not found are diffed, so re-comparing a suite where
+        little changed costs little more than the lookup. Pass functions
+        returning the responses to skip loading the pairs that are found.
+        
+        Args:
+            pairs: (response1, response2, key1, key2, rules) tuples, as for compare_responses()
+            max_differences: Overrides the comparator's difference limit for these calls
         
         Returns:
-            Dictionary containing comparison results
+            Comparison results in the order of the pairs
         """
-        # Check if responses are identical
-        identical = response1 == response2
+        pairs = list(pairs)
+        persist = self.store is not None and self.backend == "native"
+        # Rules objects are shared by many pairs, so each is fingerprinted once
+        fingerprints: Dict[int, str] = {}
+        store_keys = []
+        for _, _, key1, key2, rules in pairs:
+            if not (persist and key1 and key2):
+                store_keys.append(None)
+                continue
+            if id(rules) not in fingerprints:
+                fingerprints[id(rules)] = self.fingerprint(rules, max_differences=max_differences)
+            store_keys.append((key1, key2, fingerprints[id(rules)]))
+        
+        stored = self.store.get_comparisons(k for k in store_keys if k) if persist else {}
+        results = []
+        computed = {}
+        for (response1, response2, key1, key2, rules), store_key in zip(pairs, store_keys):
+            result = stored.get(store_key) if store_key else None
+            if result is None:
+                result = self._compare(_load(response1), _load(response2), self.backend,
+                                       max_differences, key1, key2, rules)
+                if store_key:
+                    computed[store_key] = stored[store_key] = result
+            results.append(result)
+        
+        if computed:
+            self.store.save_comparisons(computed)
+        return results
+    
+    def _compare(self, response1: Any, response2: Any, backend: str, max_differences: Optional[int],
+                 key1: Optional[str], key2: Optional[str], rules: Optional[ComparisonRules]) -> Dict[str, Any]:
+        max_differences = max_differences if max_differences is not None else self.max_differences
+        
+        # Hash both responses once; equal root digests mean identical responses
+        tree1 = self.get_tree(response1, key1)
+        tree2 = self.get_tree(response2, key2)
         
-        if identical:
+        if tree1.digest == tree2.digest:
             return {
                 "identical": True,
                 "differences": [],
                 "summary": "Responses are identical"
             }
         
-        # Use DeepDiff for detailed comparison
-        diff = DeepDiff(response1, response2, ignore_order=False, verbose_level=2)
+        truncated = False
+        if backend == "deepdiff":
+            from deepdiff import DeepDiff
+            diff = DeepDiff(response1, response2, ignore_order=False, verbose_level=2)
+        else:
+            # Descend only into subtrees whose hashes differ, stopping early if asked
+            found = iter_differences(tree1, tree2, rules=rules)
+            if max_differences is not None:
+                found = list(islice(found, max_differences + 1))
+                truncated = len(found) > max_differences
+                found = found[:max_differences]
+            diff = _group_differences(found)
+        
+        # Rules such as unordered lists can make different trees compare equal
+        if not diff:
+            return {
+                "identical": True,
+                "differences": [],
+                "summary": "Responses are identical"
+            }
         
         differences = []
         
@@ -63,42 +699,36 @@ class ResponseComparator:
             for item in diff['iterable_item_removed']:
                 differences.append(f"List item removed: {item}")
         
+        summary = f"Found {len(differences)} difference(s)"
+        if truncated:
+            summary += f" (stopped after the first {max_differences})"
+        
         return {
             "identical": False,
             "differences": differences,
             "detailed_diff": diff,
-            "summary": f"Found {len(differences)} difference(s)"
+            "summary": summary,
+            "truncated": truncated
         }
     
     def compare_structure(self, response1: Dict, response2: Dict) -> Dict[str, Any]:
         """
-        Compare only the structure (keys) of two responses, ignoring values
+        Compare only the structure (keys and types) of two responses, ignoring values
+        
+        Every element of a list contributes to its structure, not just the
+        first. Paths use the comparison settings' syntax, e.g. "data.items[*].id".
         """
-        def get_structure(obj, prefix=""):
-            """Recursively get all keys in nested structure"""
-            keys = set()
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    full_key = f"{prefix}.{key}" if prefix else key
-                    keys.add(full_key)
-                    if isinstance(value, (dict, list)):
-                        keys.update(get_structure(value, full_key))
-            elif isinstance(obj, list) and obj:
-                keys.update(get_structure(obj[0], f"{prefix}[0]"))
-            return keys
-        
-        structure1 = get_structure(response1)
-        structure2 = get_structure(response2)
-        
-        added_keys = structure2 - structure1
-        removed_keys = structure1 - structure2
-        common_keys = structure1 & structure2
+        schema1, schema2 = infer_schema(response1), infer_schema(response2)
+        diff = diff_schemas(schema1, schema2)
+        structure1 = set(flatten_schema(schema1)) - {ROOT_PATH}
+        structure2 = set(flatten_schema(schema2)) - {ROOT_PATH}
         
         return {
-            "structure_identical": structure1 == structure2,
-            "added_keys": list(added_keys),
-            "removed_keys": list(removed_keys),
-            "common_keys": list(common_keys)
+            "structure_identical": structure1 == structure2 and not diff['type_changes'],
+            "added_keys": diff['added'],
+            "removed_keys": diff['removed'],
+            "common_keys": sorted(structure1 & structure2),
+            "type_changes": diff['type_changes']
         }
     
     def get_key_differences(self, response1: Dict, response2: Dict, 
@@ -144,29 +774,38 @@ class ResponseComparator:
         
         return differences
     
-    def calculate_similarity_score(self, response1: Dict, response2: Dict) -> float:
+    def calculate_similarity_score(self, response1: Dict, response2: Dict,
+                                   key1: Optional[str] = None, key2: Optional[str] = None,
+                                   cutoff: float = 0.0) -> float:
         """
         Calculate a similarity score between 0 and 1
         
+        The score is the share of tree nodes the two responses have in
+        common (2 * matched / (size1 + size2)), so a shifted list item or an
+        extra field only costs the nodes involved.
+        
+        Args:
+            response1: First response
+            response2: Second response
+            key1, key2: Optional content keys (e.g. response_hash) for reusing cached trees
+            cutoff: Skip the tree walk and return the size-based upper bound when
+                that bound is already below this score
+        
         Returns:
             Float between 0 (completely different) and 1 (identical)
         """
-        if response1 == response2:
-            return 1.0
+        tree1 = self.get_tree(response1, key1)
+        tree2 = self.get_tree(response2, key2)
         
-        # Convert to JSON strings for comparison
-        str1 = json.dumps(response1, sort_keys=True)
-        str2 = json.dumps(response2, sort_keys=True)
-        
-        # Simple character-based similarity
-        len1, len2 = len(str1), len(str2)
-        max_len = max(len1, len2)
-        
-        if max_len == 0:
+        if tree1.digest == tree2.digest:
             return 1.0
         
-        # Calculate Levenshtein distance (simplified)
-        matching_chars = sum(c1 == c2 for c1, c2 in zip(str1, str2))
-        similarity = matching_chars / max_len
+        total = tree1.size + tree2.size
+        upper_bound = 2 * min(tree1.size, tree2.size) / total
+        if upper_bound < cutoff:
+            return round(upper_bound, 2)
+        
+        matched = _matched_size(tree1, tree2, SIMILARITY_ALIGN_LIMIT)
+        similarity = 2 * matched / total
         
         return round(similarity, 2)
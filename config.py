@@ -9,10 +9,65 @@ APP_HOST = "0.0.0.0"
 
 # Database settings
 DATABASE_PATH = "data/api_tests.db"
+DB_POOL_SIZE = 8  # pooled SQLite connections per Database
+DB_BUSY_TIMEOUT = 30  # seconds to wait for a locked database
+DB_READ_CACHE_TTL = 30  # seconds cached reads may lag writes from other processes (0 disables)
+HISTORY_MERGE_MAX_CONFIGS = 16  # history filters matching more configs use one IN query instead of a merge
+BLOB_COMPRESSION = "zstd"  # "zstd" (if installed) or "zlib" for stored responses
+BLOB_COMPRESSION_LEVEL = 6
+BLOB_MIN_COMPRESS_SIZE = 256  # smaller responses are stored uncompressed
+
+# Version labels used to pair configurations of a task
+BEFORE_VERSION = "Before Change"
+AFTER_VERSION = "After Change"
 
 # API settings
 DEFAULT_TIMEOUT = 30  # seconds
-MAX_RETRIES = 3
+MAX_RETRIES = 3  # retries after a timeout, connection error or retryable status
+RETRY_BACKOFF_BASE = 0.5  # seconds; the backoff cap doubles with every retry
+RETRY_BACKOFF_MAX = 30  # longest wait before a retry, including Retry-After
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+RETRY_METHODS = ("GET", "HEAD", "OPTIONS")  # methods retried after a timeout or 5xx (any method on 429)
+RATE_LIMIT_PER_HOST = 0  # requests per second sent to each host (0 disables)
+RATE_LIMIT_BURST = 10  # requests a host may get at once before the rate applies
+RESPONSE_CHUNK_SIZE = 64 * 1024  # bytes read per chunk when streaming bodies
+RESPONSE_SPILL_THRESHOLD = 8 * 1024 * 1024  # bodies above this many bytes go to disk
+RESPONSE_SPILL_DIR = "data/responses"
+BATCH_MAX_WORKERS = 16  # requests in flight during batch execution
+MAX_REQUESTS_PER_HOST = 8  # requests in flight per host
+ASYNC_MAX_CONCURRENCY = 500  # requests in flight during async batch execution
+ASYNC_MAX_CONNECTIONS = 100  # pooled connections of the async client
+ASYNC_MAX_KEEPALIVE = 20  # idle keep-alive connections the async client holds on to
+ASYNC_HTTP2 = False  # negotiate HTTP/2 in the async client (needs httpx[http2])
+REPLAY_CACHE_SIZE = 1024  # recorded exchanges kept in memory while replaying
+RECORD_QUEUE_SIZE = 1000  # exchanges waiting to be recorded before requests wait for the writer
+RECORD_BATCH_SIZE = 100  # recorded exchanges saved per transaction
+REPLAY_PORT = 9000  # first port of the replay servers ("Before Change"; "After Change" gets the next)
+SHADOW_PORT = 8800  # port the shadow-traffic proxy listens on
+SHADOW_SAMPLE_RATE = 1.0  # share of proxied requests mirrored to "After Change"
+SHADOW_QUEUE_SIZE = 1000  # mirrors waiting to be sent; more are dropped, never waited for
+SHADOW_WORKERS = 8  # threads sending mirrors and comparing the pairs
+SUITE_CHUNK_SIZE = 100  # test cases executed and saved per transaction in a suite run
+SUITE_IMPORT_CHUNK_SIZE = 1000  # test cases written per transaction when importing a suite
+LOAD_MAX_WORKERS = 64  # threads sending requests in a rate-driven load test
+LOAD_DEFAULT_DURATION = 10  # seconds a load test runs
+LOAD_DEFAULT_CONCURRENCY = 8  # concurrent requests per version in a load test
+
+# Comparison settings
+COMPARATOR_BACKEND = "native"  # "native" or "deepdiff"
+MAX_DIFFERENCES = 1000  # differences reported per comparison before stopping
+COMPARATOR_TREE_CACHE_SIZE = 32  # hashed responses kept for repeated comparisons
+COMPARATOR_LEAF_CACHE_MAX_LENGTH = 256  # longer strings are hashed every time instead of cached
+SIMILARITY_ALIGN_LIMIT = 4_000_000  # max len1 * len2 for aligning changed arrays
+SUITE_COMPARE_PROCESSES = 0  # worker processes comparing a suite overview's pairs (0 = one per CPU core)
+SUITE_COMPARE_CHUNK_SIZE = 50  # pairs sent to a worker process at a time
+
+# Performance regression settings
+REGRESSION_ALPHA = 0.01  # significance level of the Mann-Whitney test
+REGRESSION_MIN_CHANGE = 0.05  # median change the confidence interval must clear (5%)
+REGRESSION_MIN_SAMPLES = 8  # executions per version needed before testing
+REGRESSION_MAX_SAMPLES = 1000  # most recent executions per version that are analyzed
+REGRESSION_BOOTSTRAP_RESAMPLES = 1000
 
 # UI settings
 MAX_RESULTS_DISPLAY = 50
@@ -0,0 +1,186 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from capture import parse_stored
+from comparator import ResponseComparator
+from database import Database
+from rules import ComparisonRules
+from schema import diff_schemas
+from config import BEFORE_VERSION, AFTER_VERSION, SUITE_COMPARE_PROCESSES, SUITE_COMPARE_CHUNK_SIZE
+
+IDENTICAL = 'identical'
+DIFFERENT = 'different'
+MISSING = 'missing'
+
+# (before text, after text, before key, after key, rules settings as JSON, stored result or None)
+_Job = Tuple[str, str, Optional[str], Optional[str], str, Optional[Dict[str, Any]]]
+
+
+@lru_cache(maxsize=64)
+def _worker_rules(settings_json: str) -> ComparisonRules:
+    return ComparisonRules.from_settings(json.loads(settings_json))
+
+
+def compare_jobs(jobs: List[_Job], max_differences: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Compare pairs of stored responses and score their similarity
+    
+    Runs in worker processes, so everything it needs is passed in. A job
+    that already has a stored comparison result only gets its similarity.
+    """
+    comparator = ResponseComparator("native", max_differences)
+    results = []
+    for text1, text2, key1, key2, settings_json, result in jobs:
+        response1, response2 = parse_stored(text1), parse_stored(text2)
+        if result is None:
+            result = comparator.compare_responses(response1, response2, key1=key1, key2=key2,
+                                                  rules=_worker_rules(settings_json))
+        result = dict(result)
+        result['similarity'] = 1.0 if result['identical'] else comparator.calculate_similarity_score(
+            response1, response2, key1=key1, key2=key2
+        )
+        results.append(result)
+    return results
+
+
+class SuiteDashboard:
+    """
+    Compares the latest before/after pair of every test case of a task at once
+    
+    The pairs are read with one query and their comparisons looked up in the
+    comparison store with another, so a suite whose responses did not change
+    since it was last viewed needs no response bodies at all. The remaining
+    pairs are compared in chunks across worker processes, one per CPU core
+    by default, and their results stored for the next view.
+    """
+    
+    def __init__(self, db: Database, comparator: ResponseComparator,
+                 processes: int = SUITE_COMPARE_PROCESSES, chunk_size: int = SUITE_COMPARE_CHUNK_SIZE):
+        self.db = db
+        self.comparator = comparator
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+    
+    def _compare(self, jobs: List[_Job]) -> List[Dict[str, Any]]:
+        max_differences = self.comparator.max_differences
+        # Starting processes only pays off once there are several chunks to spread
+        if self.processes == 1 or len(jobs) <= self.chunk_size:
+            return compare_jobs(jobs, max_differences)
+        
+        chunks = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+        with ProcessPoolExecutor(max_workers=min(self.processes, len(chunks))) as executor:
+            return [
+                result
+                for results in executor.map(compare_jobs, chunks, [max_differences] * len(chunks))
+                for result in results
+            ]
+    
+    def overview(self, task_name: str) -> List[Dict[str, Any]]:
+        """
+        Get one row per test case of a task for triage
+        
+        Returns:
+            Rows ordered by test case name with the keys test_case_name,
+            status (identical, different or missing), differences, similarity,
+            before/after status codes, status_changed, before/after response
+            times, latency_delta (seconds, after minus before) and
+            latency_change (relative)
+        """
+        pairs = self.db.get_suite_pairs(task_name, BEFORE_VERSION, AFTER_VERSION)
+        rules = ComparisonRules.from_settings(self.db.get_comparison_settings(task_name))
+        
+        # Cases share masks, so each distinct set is compiled and fingerprinted once
+        case_rules: Dict[str, Tuple[ComparisonRules, str]] = {}
+        store_keys: List[Optional[Tuple[str, str, str]]] = []
+        for pair in pairs:
+            rules_key = json.dumps(pair['rules'], sort_keys=True)
+            if rules_key not in case_rules:
+                merged = rules.merged(pair['rules'])
+                case_rules[rules_key] = (merged, self.comparator.fingerprint(merged, backend="native"))
+            before_hash, after_hash = pair['before_response_hash'], pair['after_response_hash']
+            store_keys.append(
+                (before_hash, after_hash, case_rules[rules_key][1]) if before_hash and after_hash else None
+            )
+        stored = self.db.get_comparisons(k for k in store_keys if k)
+        
+        # Pairs never compared with these settings, or compared but not yet scored
+        pending = []
+        comparisons: Dict[int, Dict[str, Any]] = {}
+        for index, (pair, store_key) in enumerate(zip(pairs, store_keys)):
+            if pair['before_id'] is None or pair['after_id'] is None:
+                continue
+            result = stored.get(store_key) if store_key else None
+            if result is not None and (result['identical'] or 'similarity' in result):
+                comparisons[index] = result
+            else:
+                pending.append((index, result))
+        
+        if pending:
+            texts = self.db.get_response_texts(
+                result_id for index, _ in pending
+                for result_id in (pairs[index]['before_id'], pairs[index]['after_id'])
+            )
+            jobs = []
+            for index, result in pending:
+                pair = pairs[index]
+                jobs.append((
+                    texts[pair['before_id']], texts[pair['after_id']],
+                    pair['before_response_hash'], pair['after_response_hash'],
+                    json.dumps(case_rules[json.dumps(pair['rules'], sort_keys=True)][0].settings),
+                    result
+                ))
+            computed = {}
+            for (index, _), result in zip(pending, self._compare(jobs)):
+                comparisons[index] = result
+                if store_keys[index]:
+                    computed[store_keys[index]] = result
+            self.db.save_comparisons(computed)
+        
+        return [self._row(pair, comparisons.get(index)) for index, pair in enumerate(pairs)]
+    
+    def schema_drift(self, task_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Compare the response schemas of a task's two versions
+        
+        Each version's schema is merged from all of its successful
+        responses, so optional fields and list sizes reflect every sample.
+        Only results saved since the last check are read to bring the
+        schemas up to date. See schema.diff_schemas() for the result.
+        
+        Returns:
+            The schema diff, or None until both versions have a successful response
+        """
+        configs = {config['api_version']: config for config in self.db.get_configs_by_task(task_name)}
+        if BEFORE_VERSION not in configs or AFTER_VERSION not in configs:
+            return None
+        config_ids = [configs[BEFORE_VERSION]['id'], configs[AFTER_VERSION]['id']]
+        self.db.update_response_schemas(config_ids)
+        before, after = (self.db.get_response_schema(config_id) for config_id in config_ids)
+        if before is None or after is None:
+            return None
+        return diff_schemas(before, after)
+    
+    @staticmethod
+    def _row(pair: Dict[str, Any], comparison: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        before_time, after_time = pair['before_response_time'], pair['after_response_time']
+        if comparison is None:
+            status = MISSING
+        else:
+            status = IDENTICAL if comparison['identical'] else DIFFERENT
+        both = comparison is not None
+        return {
+            "test_case_name": pair['test_case_name'],
+            "status": status,
+            "differences": len(comparison['differences']) if both else None,
+            "similarity": comparison.get('similarity', 1.0) if both else None,
+            "summary": comparison['summary'] if both else "",
+            "before_status_code": pair['before_status_code'],
+            "after_status_code": pair['after_status_code'],
+            "status_changed": both and pair['before_status_code'] != pair['after_status_code'],
+            "before_response_time": before_time,
+            "after_response_time": after_time,
+            "latency_delta": after_time - before_time if both else None,
+            "latency_change": (after_time - before_time) / before_time if both and before_time else None
+        }
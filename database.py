@@ -1,246 +1,1421 @@
 import sqlite3
 import json
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
 from datetime import datetime
-from typing import List, Dict, Optional
+from itertools import islice
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
 import os
+import tempfile
+from blob_store import content_hash, compress, compress_file, decompress
+from schema import infer_schema
+from config import (DB_POOL_SIZE, DB_BUSY_TIMEOUT, DB_READ_CACHE_TTL, SUITE_IMPORT_CHUNK_SIZE, RESPONSE_CHUNK_SIZE,
+                    HISTORY_MERGE_MAX_CONFIGS)
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections tuned for concurrent writers"""
+    
+    PRAGMAS = [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -16000",
+        f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT * 1000)}",
+    ]
+    
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with the pool's pragmas applied"""
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening one if the pool is not full yet"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+    
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+    
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+class ReadCache:
+    """
+    Results of read queries, kept until a write touches a table they read
+    
+    Every table has a generation counter that writes bump. An entry is only
+    served while the generations it was loaded under are current and it is
+    younger than ttl seconds, which bounds staleness from other processes
+    (e.g. the CLI) writing to the same database file.
+    """
+    
+    MAX_ENTRIES = 1024
+    
+    def __init__(self, ttl: float = DB_READ_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+    
+    def get_or_load(self, key, tables: Tuple[str, ...], load):
+        """Get a cached result, or load and cache it"""
+        if not self.ttl:
+            return load()
+        
+        now = time.monotonic()
+        with self._lock:
+            generation = tuple(self._generations[table] for table in tables)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation and now - entry[1] < self.ttl:
+                return entry[2]
+        
+        value = load()
+        with self._lock:
+            # A write that committed while loading may not be reflected in value
+            if tuple(self._generations[table] for table in tables) == generation:
+                if len(self._entries) >= self.MAX_ENTRIES:
+                    self._entries.clear()
+                self._entries[key] = (generation, now, value)
+        return value
+    
+    def invalidate(self, *tables: str):
+        """Drop cached results that read any of the tables"""
+        with self._lock:
+            for table in tables:
+                self._generations[table] += 1
+    
+    def clear(self):
+        """Drop all cached results"""
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_read(*tables: str):
+    """
+    Cache a Database read method's results until one of tables is written
+    
+    Cached results are shared between callers and must not be modified.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (method.__name__, args, tuple(sorted(kwargs.items())))
+            return self.read_cache.get_or_load(key, tables, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+# Marks stored response_data that is not JSON
+_UNPARSABLE = object()
+
+# Python types of parsed JSON values, by the names comparison results store them under
+_JSON_TYPES_BY_NAME = {kind.__name__: kind for kind in (type(None), bool, int, float, str, dict, list)}
+
 
 class Database:
-    def __init__(self, db_path: str = "data/api_tests.db"):
+    # Schema changes applied on top of the base tables, in order. The index
+    # of each entry + 1 is the PRAGMA user_version it migrates to.
+    MIGRATIONS = [
+        # 1: group results of a paired before/after execution
+        [
+            "ALTER TABLE test_results ADD COLUMN run_id TEXT",
+            "CREATE INDEX IF NOT EXISTS idx_test_results_run_id ON test_results (run_id)",
+        ],
+        # 2: history indexes and a trigger-maintained latest result per (config, test case)
+        [
+            """CREATE INDEX IF NOT EXISTS idx_test_results_config_case
+               ON test_results (config_id, test_case_name, executed_at, id)""",
+            """CREATE INDEX IF NOT EXISTS idx_test_results_executed_at
+               ON test_results (executed_at, id)""",
+            """CREATE TABLE IF NOT EXISTS latest_results (
+                   config_id INTEGER NOT NULL,
+                   test_case_name TEXT NOT NULL,
+                   result_id INTEGER NOT NULL,
+                   PRIMARY KEY (config_id, test_case_name)
+               ) WITHOUT ROWID""",
+            """INSERT OR REPLACE INTO latest_results (config_id, test_case_name, result_id)
+               SELECT config_id, test_case_name, MAX(id)
+               FROM test_results
+               GROUP BY config_id, test_case_name""",
+            """CREATE TRIGGER IF NOT EXISTS trg_test_results_latest_insert
+               AFTER INSERT ON test_results
+               BEGIN
+                   INSERT INTO latest_results (config_id, test_case_name, result_id)
+                   VALUES (NEW.config_id, NEW.test_case_name, NEW.id)
+                   ON CONFLICT (config_id, test_case_name) DO UPDATE
+                   SET result_id = excluded.result_id
+                   WHERE excluded.result_id > latest_results.result_id;
+               END""",
+            """CREATE TRIGGER IF NOT EXISTS trg_test_results_latest_delete
+               AFTER DELETE ON test_results
+               BEGIN
+                   DELETE FROM latest_results WHERE result_id = OLD.id;
+                   INSERT OR IGNORE INTO latest_results (config_id, test_case_name, result_id)
+                   SELECT config_id, test_case_name, MAX(id)
+                   FROM test_results
+                   WHERE config_id = OLD.config_id AND test_case_name = OLD.test_case_name
+                   GROUP BY config_id, test_case_name;
+               END""",
+        ],
+        # 3: content-addressed, compressed response bodies shared across runs
+        [
+            """CREATE TABLE IF NOT EXISTS response_blobs (
+                   hash TEXT PRIMARY KEY,
+                   codec TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   data BLOB NOT NULL
+               )""",
+            "ALTER TABLE test_results ADD COLUMN response_hash TEXT",
+        ],
+        # 4: per-task comparison settings (list modes, ...) as JSON
+        [
+            """CREATE TABLE IF NOT EXISTS comparison_settings (
+                   task_name TEXT PRIMARY KEY,
+                   settings TEXT NOT NULL,
+                   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+               )""",
+        ],
+        # 5: keep query parameters so stored test cases can be replayed
+        [
+            "ALTER TABLE test_results ADD COLUMN query_params TEXT",
+        ],
+        # 6: test cases imported from suite files, with per-case comparison rules
+        [
+            """CREATE TABLE IF NOT EXISTS test_cases (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   task_name TEXT NOT NULL,
+                   name TEXT NOT NULL,
+                   payload TEXT,
+                   query_params TEXT,
+                   rules TEXT,
+                   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   UNIQUE (task_name, name)
+               )""",
+        ],
+        # 7: newest-first history pages of a single task
+        [
+            """CREATE INDEX IF NOT EXISTS idx_test_results_config_executed_at
+               ON test_results (config_id, executed_at, id)""",
+        ],
+        # 8: per-phase request timings (dns, connect, tls, ttfb, download, parse) as JSON
+        [
+            "ALTER TABLE test_results ADD COLUMN timings TEXT",
+        ],
+        # 9: load test runs, one row per version with its latency histogram
+        [
+            """CREATE TABLE IF NOT EXISTS load_results (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   run_id TEXT NOT NULL,
+                   config_id INTEGER NOT NULL,
+                   test_case_name TEXT NOT NULL,
+                   mode TEXT NOT NULL,
+                   target REAL NOT NULL,
+                   duration REAL NOT NULL,
+                   requests INTEGER NOT NULL,
+                   errors INTEGER NOT NULL,
+                   dropped INTEGER NOT NULL,
+                   throughput REAL NOT NULL,
+                   p50 REAL, p90 REAL, p99 REAL, max REAL, mean REAL,
+                   status_codes TEXT,
+                   histogram TEXT NOT NULL,
+                   executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   FOREIGN KEY (config_id) REFERENCES api_configs (id)
+               )""",
+            """CREATE INDEX IF NOT EXISTS idx_load_results_config_case
+               ON load_results (config_id, test_case_name, id)""",
+        ],
+        # 10: attempts made and seconds spent backing off before the saved response
+        [
+            "ALTER TABLE test_results ADD COLUMN attempts INTEGER NOT NULL DEFAULT 1",
+            "ALTER TABLE test_results ADD COLUMN backoff_time REAL NOT NULL DEFAULT 0",
+        ],
+        # 11: raw request/response exchanges captured in record mode, served back in replay mode
+        [
+            """CREATE TABLE IF NOT EXISTS recorded_exchanges (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   request_key TEXT NOT NULL,
+                   config_id INTEGER,
+                   method TEXT NOT NULL,
+                   url TEXT NOT NULL,
+                   request_headers TEXT,
+                   request_body BLOB,
+                   status_code INTEGER NOT NULL,
+                   response_headers TEXT,
+                   response_hash TEXT NOT NULL REFERENCES response_blobs (hash),
+                   response_time REAL,
+                   timings TEXT,
+                   recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   FOREIGN KEY (config_id) REFERENCES api_configs (id)
+               )""",
+            """CREATE INDEX IF NOT EXISTS idx_recorded_exchanges_key
+               ON recorded_exchanges (request_key, id)""",
+            """CREATE INDEX IF NOT EXISTS idx_recorded_exchanges_config
+               ON recorded_exchanges (config_id, id)""",
+        ],
+        # 12: comparison results by the hashes of both responses and the comparator settings
+        [
+            """CREATE TABLE IF NOT EXISTS comparison_results (
+                   before_hash TEXT NOT NULL,
+                   after_hash TEXT NOT NULL,
+                   settings_hash TEXT NOT NULL,
+                   identical INTEGER NOT NULL,
+                   result TEXT NOT NULL,
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   PRIMARY KEY (before_hash, after_hash, settings_hash)
+               ) WITHOUT ROWID""",
+        ],
+        # 13: response schema per configuration, merged from its successful
+        # responses up to last_result_id
+        [
+            """CREATE TABLE IF NOT EXISTS response_schemas (
+                   config_id INTEGER PRIMARY KEY,
+                   schema TEXT NOT NULL,
+                   last_result_id INTEGER NOT NULL DEFAULT 0,
+                   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   FOREIGN KEY (config_id) REFERENCES api_configs (id)
+               )""",
+        ],
+    ]
+    
+    def __init__(self, db_path: str = "data/api_tests.db", pool_size: int = DB_POOL_SIZE,
+                 read_cache_ttl: float = DB_READ_CACHE_TTL):
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.pool = ConnectionPool(db_path, pool_size)
+        # SQLite allows a single writer; serializing writes in-process avoids
+        # lock-upgrade failures between pooled connections
+        self._write_lock = threading.Lock()
+        # Config, task and test case lists are read on every UI rerun
+        self.read_cache = ReadCache(read_cache_ttl)
         self._init_database()
     
-    def _get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection for the duration of the block"""
+        conn = self.pool.acquire()
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+    
+    @contextmanager
+    def _transaction(self):
+        """Borrow a pooled connection and run the block as one write transaction"""
+        with self._write_lock, self._connection() as conn:
+            with conn:
+                yield conn
+    
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.close()
     
     def _init_database(self):
         """Initialize database schema"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        # API Configurations table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS api_configs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                task_name TEXT NOT NULL,
-                api_version TEXT NOT NULL,
-                api_url TEXT NOT NULL,
-                method TEXT NOT NULL,
-                auth_details TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(task_name, api_version)
-            )
-        """)
-        
-        # Test Results table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS test_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                config_id INTEGER NOT NULL,
-                test_case_name TEXT NOT NULL,
-                request_payload TEXT,
-                response_data TEXT,
-                status_code INTEGER,
-                response_time REAL,
-                executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (config_id) REFERENCES api_configs (id)
-            )
-        """)
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            # API Configurations table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS api_configs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_name TEXT NOT NULL,
+                    api_version TEXT NOT NULL,
+                    api_url TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    auth_details TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(task_name, api_version)
+                )
+            """)
+            
+            # Test Results table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS test_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    config_id INTEGER NOT NULL,
+                    test_case_name TEXT NOT NULL,
+                    request_payload TEXT,
+                    response_data TEXT,
+                    status_code INTEGER,
+                    response_time REAL,
+                    executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (config_id) REFERENCES api_configs (id)
+                )
+            """)
+            
+            self._migrate(conn)
+    
+    def _migrate(self, conn: sqlite3.Connection):
+        """
+        Apply schema migrations newer than the database's user_version
+        
+        Each step runs in its own BEGIN IMMEDIATE transaction that re-reads
+        user_version once it holds the write lock, so processes opening the
+        same database at once apply every step exactly once.
+        """
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= len(self.MIGRATIONS):
+            return
+        if conn.in_transaction:
+            conn.commit()
         
-        conn.commit()
-        conn.close()
+        for target, statements in enumerate(self.MIGRATIONS, start=1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] < target:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {target}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
     
-    def save_api_config(self, task_name: str, api_version: str, api_url: str, 
+    def save_api_config(self, task_name: str, api_version: str, api_url: str,
                        method: str, auth_details: str) -> int:
         """Save API configuration"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
             cursor.execute("""
                 INSERT INTO api_configs (task_name, api_version, api_url, method, auth_details)
                 VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (task_name, api_version) DO UPDATE SET
+                    api_url = excluded.api_url,
+                    method = excluded.method,
+                    auth_details = excluded.auth_details
             """, (task_name, api_version, api_url, method, auth_details))
             
-            config_id = cursor.lastrowid
-            conn.commit()
-            return config_id
-        except sqlite3.IntegrityError:
-            # If combination exists, update it
-            cursor.execute("""
-                UPDATE api_configs 
-                SET api_url = ?, method = ?, auth_details = ?
-                WHERE task_name = ? AND api_version = ?
-            """, (api_url, method, auth_details, task_name, api_version))
-            conn.commit()
-            
             cursor.execute("""
-                SELECT id FROM api_configs 
+                SELECT id FROM api_configs
                 WHERE task_name = ? AND api_version = ?
             """, (task_name, api_version))
             config_id = cursor.fetchone()[0]
-            return config_id
-        finally:
-            conn.close()
+        
+        self.read_cache.invalidate('api_configs')
+        return config_id
     
+    @cached_read('api_configs')
     def get_all_configs(self) -> List[Dict]:
         """Get all API configurations"""
-        conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM api_configs ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        conn.close()
+        with self._connection() as conn:
+            rows = conn.execute("SELECT * FROM api_configs ORDER BY created_at DESC").fetchall()
         
         return [dict(row) for row in rows]
     
+    @cached_read('api_configs')
     def get_all_tasks(self) -> List[str]:
         """Get all unique task names"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT DISTINCT task_name FROM api_configs ORDER BY task_name")
-        rows = cursor.fetchall()
-        conn.close()
+        with self._connection() as conn:
+            rows = conn.execute("SELECT DISTINCT task_name FROM api_configs ORDER BY task_name").fetchall()
         
         return [row[0] for row in rows]
     
+    @cached_read('api_configs')
     def get_configs_by_task(self, task_name: str) -> List[Dict]:
         """Get all configurations for a specific task"""
-        conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT * FROM api_configs WHERE task_name = ? ORDER BY api_version",
-            (task_name,)
-        )
-        rows = cursor.fetchall()
-        conn.close()
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT * FROM api_configs WHERE task_name = ? ORDER BY api_version",
+                (task_name,)
+            ).fetchall()
         
         return [dict(row) for row in rows]
     
     def delete_config(self, config_id: int):
         """Delete an API configuration"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM api_configs WHERE id = ?", (config_id,))
+        self.read_cache.invalidate('api_configs')
+    
+    @cached_read('comparison_settings')
+    def get_comparison_settings(self, task_name: str) -> Dict:
+        """Get the comparison settings of a task (empty if none were saved)"""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT settings FROM comparison_settings WHERE task_name = ?",
+                (task_name,)
+            ).fetchone()
+        
+        return json.loads(row['settings']) if row else {}
+    
+    def save_comparison_settings(self, task_name: str, settings: Dict):
+        """Save the comparison settings of a task"""
+        with self._transaction() as conn:
+            conn.execute("""
+                INSERT INTO comparison_settings (task_name, settings)
+                VALUES (?, ?)
+                ON CONFLICT (task_name) DO UPDATE SET
+                    settings = excluded.settings,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (task_name, json.dumps(settings)))
+        self.read_cache.invalidate('comparison_settings')
+    
+    def import_test_cases(self, task_name: str, cases: Iterable[Dict],
+                          chunk_size: int = SUITE_IMPORT_CHUNK_SIZE, replace: bool = False) -> int:
+        """
+        Save test cases of a task, replacing cases with the same name
         
-        cursor.execute("DELETE FROM api_configs WHERE id = ?", (config_id,))
-        conn.commit()
-        conn.close()
+        Cases are consumed lazily and written chunk_size at a time, one
+        transaction per chunk, so suites of any size import in bounded memory.
+        
+        Args:
+            task_name: Task the cases belong to
+            cases: Dictionaries with name, payload, query_params and rules
+            chunk_size: Cases written per transaction
+            replace: Delete the task's other cases first; the delete and
+                the whole import are one transaction, so a suite that fails
+                to import leaves the previous cases in place
+        
+        Returns:
+            Number of cases imported
+        """
+        if replace:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM test_cases WHERE task_name = ?", (task_name,))
+                imported = self._import_test_cases(conn, task_name, cases, chunk_size)
+            self.read_cache.invalidate('test_cases')
+            return imported
+        return self._import_test_cases(None, task_name, cases, chunk_size)
     
-    def save_test_result(self, config_id: int, test_case_name: str, 
-                        request_payload: str, response_data: str, 
-                        status_code: int, response_time: float):
+    def _import_test_cases(self, conn: Optional[sqlite3.Connection], task_name: str,
+                           cases: Iterable[Dict], chunk_size: int) -> int:
+        """Write cases a chunk at a time, in conn's transaction or one transaction per chunk"""
+        cases = iter(cases)
+        imported = 0
+        while True:
+            rows = [
+                (
+                    task_name, case['name'], json.dumps(case.get('payload')),
+                    case.get('query_params') or "",
+                    json.dumps(case['rules']) if case.get('rules') else None
+                )
+                for case in islice(cases, chunk_size)
+            ]
+            if not rows:
+                return imported
+            
+            with (nullcontext(conn) if conn is not None else self._transaction()) as chunk_conn:
+                chunk_conn.executemany("""
+                    INSERT INTO test_cases (task_name, name, payload, query_params, rules)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (task_name, name) DO UPDATE SET
+                        payload = excluded.payload,
+                        query_params = excluded.query_params,
+                        rules = excluded.rules,
+                        updated_at = CURRENT_TIMESTAMP
+                """, rows)
+            self.read_cache.invalidate('test_cases')
+            imported += len(rows)
+    
+    def iter_test_cases(self, task_name: str, page_size: int = SUITE_IMPORT_CHUNK_SIZE) -> Iterator[Dict]:
+        """
+        Iterate over the imported test cases of a task in import order
+        
+        Rows are fetched a page at a time by id, so no connection is held
+        while the caller works through a page.
+        """
+        last_id = 0
+        while True:
+            with self._connection() as conn:
+                rows = conn.execute("""
+                    SELECT id, name, payload, query_params, rules FROM test_cases
+                    WHERE task_name = ? AND id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (task_name, last_id, page_size)).fetchall()
+            if not rows:
+                return
+            
+            for row in rows:
+                yield {
+                    "name": row['name'],
+                    "payload": json.loads(row['payload']) if row['payload'] else None,
+                    "query_params": row['query_params'] or "",
+                    "rules": json.loads(row['rules']) if row['rules'] else None
+                }
+            last_id = rows[-1]['id']
+    
+    @cached_read('test_cases')
+    def get_test_case(self, task_name: str, name: str) -> Optional[Dict]:
+        """Get one imported test case of a task (None if it was not imported)"""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT name, payload, query_params, rules FROM test_cases WHERE task_name = ? AND name = ?",
+                (task_name, name)
+            ).fetchone()
+        
+        if not row:
+            return None
+        return {
+            "name": row['name'],
+            "payload": json.loads(row['payload']) if row['payload'] else None,
+            "query_params": row['query_params'] or "",
+            "rules": json.loads(row['rules']) if row['rules'] else None
+        }
+    
+    @cached_read('test_cases')
+    def count_test_cases(self, task_name: str) -> int:
+        """Get the number of imported test cases of a task"""
+        with self._connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM test_cases WHERE task_name = ?", (task_name,)
+            ).fetchone()[0]
+    
+    def delete_test_cases(self, task_name: str):
+        """Delete the imported test cases of a task"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM test_cases WHERE task_name = ?", (task_name,))
+        self.read_cache.invalidate('test_cases')
+    
+    def save_test_result(self, config_id: int, test_case_name: str,
+                        request_payload: str, response_data: str,
+                        status_code: int, response_time: float,
+                        run_id: Optional[str] = None, query_params: Optional[str] = None,
+                        timings: Optional[Dict[str, float]] = None,
+                        attempts: int = 1, backoff_time: float = 0.0):
         """Save test execution result"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        self.save_test_results_bulk([{
+            "config_id": config_id,
+            "test_case_name": test_case_name,
+            "request_payload": request_payload,
+            "response_data": response_data,
+            "status_code": status_code,
+            "response_time": response_time,
+            "run_id": run_id,
+            "query_params": query_params,
+            "timings": timings,
+            "attempts": attempts,
+            "backoff_time": backoff_time
+        }])
+    
+    def save_test_results_bulk(self, results: Iterable[Dict]) -> int:
+        """
+        Save many test execution results in a single transaction
+        
+        Response bodies are stored once per distinct content in the
+        compressed response_blobs table and referenced by hash. Nothing is
+        parsed here; response schemas catch up with saved results in
+        update_response_schemas().
+        
+        A result may give its body as a file instead ('response_file' plus
+        its sha256 as 'response_hash', see capture.storage_fields), which is
+        compressed and written to the blob store chunk by chunk, so large
+        bodies are never held in memory whole.
         
-        cursor.execute("""
-            INSERT INTO test_results 
-            (config_id, test_case_name, request_payload, response_data, status_code, response_time)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (config_id, test_case_name, request_payload, response_data, status_code, response_time))
+        Args:
+            results: Dictionaries with the same fields as save_test_result's arguments
         
-        conn.commit()
-        conn.close()
+        Returns:
+            Number of results saved
+        """
+        rows = []
+        bodies = {}
+        files = {}
+        for r in results:
+            if r.get('response_file'):
+                response_hash = r['response_hash']
+                files[response_hash] = r['response_file']
+            else:
+                data = r['response_data'].encode('utf-8')
+                response_hash = content_hash(data)
+                bodies[response_hash] = data
+            timings = r.get('timings')
+            rows.append((
+                r['config_id'], r['test_case_name'], r['request_payload'], response_hash,
+                r['status_code'], r['response_time'], r.get('run_id'), r.get('query_params'),
+                json.dumps(timings) if timings else None,
+                r.get('attempts') or 1, r.get('backoff_time') or 0.0
+            ))
+        if not rows:
+            return 0
+        
+        with self._transaction() as conn:
+            self._store_blobs(conn, bodies, files)
+            conn.executemany("""
+                INSERT INTO test_results
+                (config_id, test_case_name, request_payload, response_hash, status_code, response_time,
+                 run_id, query_params, timings, attempts, backoff_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        
+        self.read_cache.invalidate('test_results')
+        return len(rows)
+    
+    @staticmethod
+    def _parse_response(text: Optional[str]):
+        """Parse stored response_data, or return _UNPARSABLE"""
+        try:
+            return json.loads(text)
+        except (TypeError, ValueError):
+            return _UNPARSABLE
+    
+    @staticmethod
+    def _store_blobs(conn: sqlite3.Connection, bodies: Dict[str, bytes],
+                     files: Optional[Dict[str, str]] = None):
+        """
+        Add bodies (keyed by content hash) to response_blobs, compressing only unseen ones
+        
+        Bodies in files (paths keyed by content hash) are streamed in chunks
+        through a temporary file holding the compressed blob.
+        """
+        bodies = dict(bodies)
+        files = {h: path for h, path in (files or {}).items() if h not in bodies}
+        hashes = list(bodies) + list(files)
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(
+                f"SELECT hash FROM response_blobs WHERE hash IN ({placeholders})", chunk
+            ):
+                bodies.pop(row[0], None)
+                files.pop(row[0], None)
+        
+        for response_hash, path in files.items():
+            with tempfile.TemporaryFile() as compressed:
+                codec, size = compress_file(path, compressed)
+                length = compressed.tell()
+                compressed.seek(0)
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO response_blobs (hash, codec, size, data)
+                    VALUES (?, ?, ?, zeroblob(?))
+                """, (response_hash, codec, size, length))
+                if not cursor.rowcount:
+                    continue
+                if not hasattr(conn, 'blobopen'):  # Python < 3.11
+                    conn.execute("UPDATE response_blobs SET data = ? WHERE rowid = ?",
+                                 (compressed.read(), cursor.lastrowid))
+                    continue
+                with conn.blobopen('response_blobs', 'data', cursor.lastrowid) as blob:
+                    for data in iter(lambda: compressed.read(RESPONSE_CHUNK_SIZE), b''):
+                        blob.write(data)
+        
+        blobs = []
+        for response_hash, data in bodies.items():
+            codec, blob = compress(data)
+            blobs.append((response_hash, codec, len(data), blob))
+        conn.executemany("""
+            INSERT OR IGNORE INTO response_blobs (hash, codec, size, data)
+            VALUES (?, ?, ?, ?)
+        """, blobs)
+    
+    def _hydrate_result(self, row: sqlite3.Row) -> Dict:
+        """Convert a result row to a dict, restoring response_data from the blob store"""
+        result = dict(row)
+        codec = result.pop('response_codec', None)
+        blob = result.pop('response_blob', None)
+        if result['response_data'] is None and blob is not None:
+            # Bodies declared as UTF-8 are stored unchecked (see CapturedBody.storage_fields)
+            result['response_data'] = decompress(codec, blob).decode('utf-8', errors='replace')
+        return result
+    
+    def get_results_by_run(self, run_id: str) -> List[Dict]:
+        """Get all test results saved under a paired run ID"""
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT
+                    tr.*,
+                    ac.task_name,
+                    ac.api_version,
+                    ac.api_url,
+                    ac.method,
+                    rb.codec AS response_codec,
+                    rb.data AS response_blob
+                FROM test_results tr
+                JOIN api_configs ac ON tr.config_id = ac.id
+                LEFT JOIN response_blobs rb ON rb.hash = tr.response_hash
+                WHERE tr.run_id = ?
+                ORDER BY ac.api_version
+            """, (run_id,)).fetchall()
+        
+        return [self._hydrate_result(row) for row in rows]
     
+    @cached_read('api_configs', 'test_results')
     def get_test_cases_by_task(self, task_name: str) -> List[str]:
         """Get all unique test case names for a task"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT DISTINCT lr.test_case_name
+                FROM api_configs ac
+                JOIN latest_results lr ON lr.config_id = ac.id
+                WHERE ac.task_name = ?
+                ORDER BY lr.test_case_name
+            """, (task_name,)).fetchall()
         
-        cursor.execute("""
-            SELECT DISTINCT tr.test_case_name
-            FROM test_results tr
-            JOIN api_configs ac ON tr.config_id = ac.id
-            WHERE ac.task_name = ?
-            ORDER BY tr.test_case_name
-        """, (task_name,))
+        return [row[0] for row in rows]
+    
+    def get_latest_requests(self, task_name: str, preferred_version: str = "Before Change") -> List[Dict]:
+        """
+        Get the most recent request of every test case of a task, for replaying
         
-        rows = cursor.fetchall()
-        conn.close()
+        When both versions have results, the request sent to preferred_version wins.
+        """
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT lr.test_case_name, tr.request_payload, tr.query_params
+                FROM api_configs ac
+                JOIN latest_results lr ON lr.config_id = ac.id
+                JOIN test_results tr ON tr.id = lr.result_id
+                WHERE ac.task_name = ?
+                ORDER BY lr.test_case_name, ac.api_version = ? DESC, tr.id DESC
+            """, (task_name, preferred_version)).fetchall()
         
-        return [row[0] for row in rows]
+        latest = {}
+        for row in rows:
+            if row['test_case_name'] not in latest:
+                latest[row['test_case_name']] = dict(row)
+        
+        return list(latest.values())
     
     def get_results_for_comparison(self, task_name: str, test_case_name: str) -> List[Dict]:
-        """Get test results for comparison (before and after)"""
-        conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                tr.*,
-                ac.task_name,
-                ac.api_version,
-                ac.api_url,
-                ac.method
-            FROM test_results tr
-            JOIN api_configs ac ON tr.config_id = ac.id
-            WHERE ac.task_name = ? AND tr.test_case_name = ?
-            ORDER BY ac.api_version, tr.executed_at DESC
-        """, (task_name, test_case_name))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Get the most recent result for each version
-        results = {}
-        for row in rows:
-            version = row['api_version']
-            if version not in results:
-                results[version] = dict(row)
+        """Get the most recent test result of each version for comparison (before and after)"""
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT
+                    tr.*,
+                    ac.task_name,
+                    ac.api_version,
+                    ac.api_url,
+                    ac.method,
+                    rb.codec AS response_codec,
+                    rb.data AS response_blob
+                FROM api_configs ac
+                JOIN latest_results lr ON lr.config_id = ac.id AND lr.test_case_name = ?
+                JOIN test_results tr ON tr.id = lr.result_id
+                LEFT JOIN response_blobs rb ON rb.hash = tr.response_hash
+                WHERE ac.task_name = ?
+                ORDER BY ac.api_version
+            """, (test_case_name, task_name)).fetchall()
         
-        return list(results.values())
+        return [self._hydrate_result(row) for row in rows]
+    
+    @cached_read('api_configs', 'test_results', 'test_cases')
+    def get_suite_pairs(self, task_name: str, before_version: str = "Before Change",
+                        after_version: str = "After Change") -> List[Dict]:
+        """
+        Get the latest before/after results of every test case of a task in one query
+        
+        Only the columns needed to triage the pairs are read, not the response
+        bodies; a side without results has None in all of its columns.
+        
+        Returns:
+            One dict per test case, ordered by name, with the case's imported
+            rules and before_*/after_* id, status_code, response_time,
+            response_hash and executed_at
+        """
+        with self._connection() as conn:
+            rows = conn.execute("""
+                WITH pairs AS (
+                    SELECT
+                        lr.test_case_name,
+                        MAX(CASE WHEN ac.api_version = ? THEN lr.result_id END) AS before_id,
+                        MAX(CASE WHEN ac.api_version = ? THEN lr.result_id END) AS after_id
+                    FROM api_configs ac
+                    JOIN latest_results lr ON lr.config_id = ac.id
+                    WHERE ac.task_name = ?
+                    GROUP BY lr.test_case_name
+                )
+                SELECT
+                    p.test_case_name,
+                    tc.rules,
+                    b.id AS before_id, b.status_code AS before_status_code,
+                    b.response_time AS before_response_time, b.response_hash AS before_response_hash,
+                    b.executed_at AS before_executed_at,
+                    a.id AS after_id, a.status_code AS after_status_code,
+                    a.response_time AS after_response_time, a.response_hash AS after_response_hash,
+                    a.executed_at AS after_executed_at
+                FROM pairs p
+                LEFT JOIN test_results b ON b.id = p.before_id
+                LEFT JOIN test_results a ON a.id = p.after_id
+                LEFT JOIN test_cases tc ON tc.task_name = ? AND tc.name = p.test_case_name
+                ORDER BY p.test_case_name
+            """, (before_version, after_version, task_name, task_name)).fetchall()
+        
+        pairs = []
+        for row in rows:
+            pair = dict(row)
+            pair['rules'] = json.loads(pair['rules']) if pair['rules'] else None
+            pairs.append(pair)
+        return pairs
+    
+    def get_response_texts(self, result_ids: Iterable[int]) -> Dict[int, str]:
+        """Get the stored response_data of many test results, by result ID"""
+        result_ids = list(dict.fromkeys(result_ids))
+        texts = {}
+        with self._connection() as conn:
+            for i in range(0, len(result_ids), 500):
+                chunk = result_ids[i:i + 500]
+                rows = conn.execute(f"""
+                    SELECT tr.id, tr.response_data, rb.codec AS response_codec, rb.data AS response_blob
+                    FROM test_results tr
+                    LEFT JOIN response_blobs rb ON rb.hash = tr.response_hash
+                    WHERE tr.id IN ({",".join("?" * len(chunk))})
+                """, chunk).fetchall()
+                for row in rows:
+                    result = self._hydrate_result(row)
+                    texts[result['id']] = result['response_data']
+        return texts
     
     def get_all_test_results(self, limit: int = 50) -> List[Dict]:
         """Get all test results"""
-        conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                tr.*,
-                ac.task_name,
-                ac.api_version,
-                ac.api_url,
-                ac.method
-            FROM test_results tr
-            JOIN api_configs ac ON tr.config_id = ac.id
-            ORDER BY tr.executed_at DESC
-            LIMIT ?
-        """, (limit,))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT
+                    tr.*,
+                    ac.task_name,
+                    ac.api_version,
+                    ac.api_url,
+                    ac.method,
+                    rb.codec AS response_codec,
+                    rb.data AS response_blob
+                FROM test_results tr
+                JOIN api_configs ac ON tr.config_id = ac.id
+                LEFT JOIN response_blobs rb ON rb.hash = tr.response_hash
+                ORDER BY tr.executed_at DESC, tr.id DESC
+                LIMIT ?
+            """, (limit,)).fetchall()
         
-        return [dict(row) for row in rows]
+        return [self._hydrate_result(row) for row in rows]
     
     def get_test_results_by_task(self, task_name: str, limit: int = 50) -> List[Dict]:
         """Get test results for a specific task"""
-        conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                tr.*,
-                ac.task_name,
-                ac.api_version,
-                ac.api_url,
-                ac.method
-            FROM test_results tr
-            JOIN api_configs ac ON tr.config_id = ac.id
-            WHERE ac.task_name = ?
-            ORDER BY tr.executed_at DESC
-            LIMIT ?
-        """, (task_name, limit))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT
+                    tr.*,
+                    ac.task_name,
+                    ac.api_version,
+                    ac.api_url,
+                    ac.method,
+                    rb.codec AS response_codec,
+                    rb.data AS response_blob
+                FROM test_results tr
+                JOIN api_configs ac ON tr.config_id = ac.id
+                LEFT JOIN response_blobs rb ON rb.hash = tr.response_hash
+                WHERE ac.task_name = ?
+                ORDER BY tr.executed_at DESC, tr.id DESC
+                LIMIT ?
+            """, (task_name, limit)).fetchall()
+        
+        return [self._hydrate_result(row) for row in rows]
+    
+    def get_history_page(self, task_name: Optional[str] = None, api_version: Optional[str] = None,
+                         status_codes: Optional[List[int]] = None,
+                         executed_from: Optional[str] = None, executed_to: Optional[str] = None,
+                         min_response_time: Optional[float] = None,
+                         max_response_time: Optional[float] = None,
+                         after: Optional[Tuple[str, int]] = None, limit: int = 50) -> List[Dict]:
+        """
+        Get one page of test result summaries, newest first
+        
+        Only summary columns are returned; use get_result_detail for the
+        request and response bodies. Pages are keyset-paginated on
+        (executed_at, id), so every page costs the same however deep it is.
+        
+        Args:
+            task_name: Only results of this task
+            api_version: Only results of this version
+            status_codes: Only results with one of these status codes
+            executed_from: Only results executed at or after this time ('YYYY-MM-DD[ HH:MM:SS]')
+            executed_to: Only results executed before this time
+            min_response_time: Only results at least this slow, in seconds
+            max_response_time: Only results at most this slow, in seconds
+            after: (executed_at, id) of the last row of the previous page
+            limit: Maximum number of rows
+        
+        Returns:
+            List of dictionaries with id, executed_at, task_name, api_version,
+            api_url, method, test_case_name, status_code, response_time,
+            run_id and response_size
+        """
+        conditions = []
+        params = []
+        if status_codes:
+            conditions.append(f"tr.status_code IN ({','.join('?' * len(status_codes))})")
+            params.extend(status_codes)
+        if executed_from is not None:
+            conditions.append("tr.executed_at >= ?")
+            params.append(executed_from)
+        if executed_to is not None:
+            conditions.append("tr.executed_at < ?")
+            params.append(executed_to)
+        if min_response_time is not None:
+            conditions.append("tr.response_time >= ?")
+            params.append(min_response_time)
+        if max_response_time is not None:
+            conditions.append("tr.response_time <= ?")
+            params.append(max_response_time)
+        if after is not None:
+            conditions.append("(tr.executed_at, tr.id) < (?, ?)")
+            params.extend(after)
+        
+        with self._connection() as conn:
+            # A task or version filter narrows results to a few configs. Each
+            # config's newest rows are read in index order and merged, rather
+            # than sorting every row of the task for each page. A filter that
+            # matches many configs (e.g. only a version) is one IN query
+            # instead, as SQLite limits the terms of a compound SELECT.
+            config_ids = [None]
+            if task_name is not None or api_version is not None:
+                config_filter = ("SELECT id FROM api_configs "
+                                 "WHERE (? IS NULL OR task_name = ?) AND (? IS NULL OR api_version = ?)")
+                filter_params = [task_name, task_name, api_version, api_version]
+                config_ids = [row[0] for row in conn.execute(
+                    f"{config_filter} LIMIT ?", filter_params + [HISTORY_MERGE_MAX_CONFIGS + 1]
+                )]
+                if not config_ids:
+                    return []
+                if len(config_ids) > HISTORY_MERGE_MAX_CONFIGS:
+                    config_ids = [None]
+                    conditions.insert(0, f"tr.config_id IN ({config_filter})")
+                    params[:0] = filter_params
+            
+            branches = []
+            branch_params = []
+            for config_id in config_ids:
+                branch_conditions = list(conditions)
+                if config_id is not None:
+                    branch_conditions.insert(0, "tr.config_id = ?")
+                where = f"WHERE {' AND '.join(branch_conditions)}" if branch_conditions else ""
+                branches.append(f"""
+                    SELECT * FROM (
+                        SELECT tr.id, tr.config_id, tr.executed_at, tr.test_case_name, tr.status_code,
+                               tr.response_time, tr.run_id, tr.response_hash, tr.attempts,
+                               length(tr.response_data) AS inline_size
+                        FROM test_results tr
+                        {where}
+                        ORDER BY tr.executed_at DESC, tr.id DESC
+                        LIMIT ?
+                    )""")
+                branch_params += ([config_id] if config_id is not None else []) + params + [limit]
+            
+            rows = conn.execute(f"""
+                SELECT
+                    page.id,
+                    page.executed_at,
+                    ac.task_name,
+                    ac.api_version,
+                    ac.api_url,
+                    ac.method,
+                    page.test_case_name,
+                    page.status_code,
+                    page.response_time,
+                    page.run_id,
+                    page.attempts,
+                    COALESCE(rb.size, page.inline_size) AS response_size
+                FROM ({" UNION ALL ".join(branches)}) page
+                JOIN api_configs ac ON page.config_id = ac.id
+                LEFT JOIN response_blobs rb ON rb.hash = page.response_hash
+                ORDER BY page.executed_at DESC, page.id DESC
+                LIMIT ?
+            """, branch_params + [limit]).fetchall()
         
         return [dict(row) for row in rows]
+    
+    def get_result_detail(self, result_id: int) -> Optional[Dict]:
+        """Get a test result with its request payload, query params and response body"""
+        with self._connection() as conn:
+            row = conn.execute("""
+                SELECT
+                    tr.id,
+                    tr.request_payload,
+                    tr.query_params,
+                    tr.response_data,
+                    rb.codec AS response_codec,
+                    rb.data AS response_blob
+                FROM test_results tr
+                LEFT JOIN response_blobs rb ON rb.hash = tr.response_hash
+                WHERE tr.id = ?
+            """, (result_id,)).fetchone()
+        
+        return self._hydrate_result(row) if row else None
+    
+    def save_load_results(self, results: Iterable[Dict]) -> int:
+        """
+        Save load test results, one per version, in a single transaction
+        
+        Args:
+            results: Dictionaries with run_id, config_id, test_case_name, mode
+                ("rate" or "concurrency"), target, a LoadResult summary() under
+                "summary" and the histogram's to_dict() under "histogram"
+        
+        Returns:
+            Number of results saved
+        """
+        rows = [
+            (
+                r['run_id'], r['config_id'], r['test_case_name'], r['mode'], r['target'],
+                r['summary']['duration'], r['summary']['requests'], r['summary']['errors'],
+                r['summary']['dropped'], r['summary']['throughput'],
+                r['summary']['p50'], r['summary']['p90'], r['summary']['p99'],
+                r['summary']['max'], r['summary']['mean'],
+                json.dumps(r['summary']['status_codes']), json.dumps(r['histogram'])
+            )
+            for r in results
+        ]
+        with self._transaction() as conn:
+            conn.executemany("""
+                INSERT INTO load_results
+                (run_id, config_id, test_case_name, mode, target, duration, requests, errors,
+                 dropped, throughput, p50, p90, p99, max, mean, status_codes, histogram)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+    
+    def get_load_results(self, task_name: str, test_case_name: str, limit: int = 10) -> List[Dict]:
+        """Get the latest load test results of a test case, newest first, both versions"""
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT lr.*, ac.task_name, ac.api_version
+                FROM load_results lr
+                JOIN api_configs ac ON lr.config_id = ac.id
+                WHERE ac.task_name = ? AND lr.test_case_name = ?
+                ORDER BY lr.id DESC
+                LIMIT ?
+            """, (task_name, test_case_name, limit)).fetchall()
+        
+        results = []
+        for row in rows:
+            result = dict(row)
+            result['status_codes'] = json.loads(result['status_codes'] or '{}')
+            result['histogram'] = json.loads(result['histogram'])
+            results.append(result)
+        return results
+    
+    def get_latency_samples(self, task_name: str, test_case_name: Optional[str] = None,
+                            max_samples: int = 1000) -> Dict[Tuple[str, str], List[float]]:
+        """
+        Get the response times of every stored execution of a task's test cases
+        
+        Executions that got no response are left out. Only the most recent
+        max_samples executions of each (test case, version) are returned.
+        
+        Returns:
+            Dictionary mapping (test_case_name, api_version) to response times
+        """
+        case_filter = "AND tr.test_case_name = ?" if test_case_name is not None else ""
+        params = [task_name] + ([test_case_name] if test_case_name is not None else []) + [max_samples]
+        with self._connection() as conn:
+            rows = conn.execute(f"""
+                SELECT test_case_name, api_version, response_time
+                FROM (
+                    SELECT
+                        tr.test_case_name,
+                        ac.api_version,
+                        tr.response_time,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY tr.config_id, tr.test_case_name ORDER BY tr.id DESC
+                        ) AS recency
+                    FROM test_results tr
+                    JOIN api_configs ac ON tr.config_id = ac.id
+                    WHERE ac.task_name = ? {case_filter} AND tr.status_code > 0
+                )
+                WHERE recency <= ?
+            """, params).fetchall()
+        
+        samples = {}
+        for case_name, version, response_time in rows:
+            samples.setdefault((case_name, version), []).append(response_time)
+        return samples
+    
+    def save_recorded_exchanges(self, exchanges: Iterable[Dict]) -> int:
+        """
+        Save captured request/response exchanges in a single transaction
+        
+        Args:
+            exchanges: Dictionaries with request_key, config_id, method, url,
+                request_headers (dict), request_body (bytes), status_code,
+                response_headers (dict), response_body (bytes), response_time
+                and timings (dict)
+        
+        Returns:
+            Number of exchanges saved
+        """
+        rows = []
+        bodies = {}
+        for e in exchanges:
+            response_hash = content_hash(e['response_body'])
+            bodies[response_hash] = e['response_body']
+            rows.append((
+                e['request_key'], e.get('config_id'), e['method'], e['url'],
+                json.dumps(e.get('request_headers') or {}), e.get('request_body'),
+                e['status_code'], json.dumps(e.get('response_headers') or {}), response_hash,
+                e.get('response_time'), json.dumps(e['timings']) if e.get('timings') else None
+            ))
+        if not rows:
+            return 0
+        
+        with self._transaction() as conn:
+            self._store_blobs(conn, bodies)
+            conn.executemany("""
+                INSERT INTO recorded_exchanges
+                (request_key, config_id, method, url, request_headers, request_body,
+                 status_code, response_headers, response_hash, response_time, timings)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+    
+    def _hydrate_exchange(self, row: sqlite3.Row) -> Dict:
+        """Convert an exchange row to a dict with decoded headers and the response body"""
+        exchange = dict(row)
+        exchange['request_headers'] = json.loads(exchange['request_headers'] or '{}')
+        exchange['response_headers'] = json.loads(exchange['response_headers'] or '{}')
+        exchange['timings'] = json.loads(exchange['timings']) if exchange['timings'] else None
+        exchange['response_body'] = decompress(exchange.pop('response_codec'), exchange.pop('response_blob'))
+        return exchange
+    
+    def get_recorded_exchange(self, request_key: str) -> Optional[Dict]:
+        """Get the most recently recorded exchange for a request key"""
+        with self._connection() as conn:
+            row = conn.execute("""
+                SELECT re.*, rb.codec AS response_codec, rb.data AS response_blob
+                FROM recorded_exchanges re
+                JOIN response_blobs rb ON rb.hash = re.response_hash
+                WHERE re.request_key = ?
+                ORDER BY re.id DESC
+                LIMIT 1
+            """, (request_key,)).fetchone()
+        return self._hydrate_exchange(row) if row else None
+    
+    def iter_recorded_exchanges(self, config_id: Optional[int] = None,
+                                page_size: int = 100) -> Iterator[Dict]:
+        """
+        Iterate over recorded exchanges (of one configuration), oldest first
+        
+        Rows are fetched a page at a time by id, so no connection is held
+        while the caller works through a page.
+        """
+        last_id = 0
+        while True:
+            with self._connection() as conn:
+                rows = conn.execute("""
+                    SELECT re.*, rb.codec AS response_codec, rb.data AS response_blob
+                    FROM recorded_exchanges re
+                    JOIN response_blobs rb ON rb.hash = re.response_hash
+                    WHERE re.id > ? AND (? IS NULL OR re.config_id = ?)
+                    ORDER BY re.id
+                    LIMIT ?
+                """, (last_id, config_id, config_id, page_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._hydrate_exchange(row)
+            last_id = rows[-1]['id']
+    
+    def count_recorded_exchanges(self, config_id: Optional[int] = None) -> int:
+        """Count recorded exchanges (of one configuration)"""
+        with self._connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM recorded_exchanges WHERE ? IS NULL OR config_id = ?",
+                (config_id, config_id)
+            ).fetchone()[0]
+    
+    def delete_recorded_exchanges(self, config_id: Optional[int] = None):
+        """Delete recorded exchanges (of one configuration, or all)"""
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM recorded_exchanges WHERE ? IS NULL OR config_id = ?",
+                (config_id, config_id)
+            )
+    
+    def get_comparisons(self, keys: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], Dict]:
+        """
+        Get persisted comparison results
+        
+        Args:
+            keys: (before_hash, after_hash, settings_hash) tuples
+        
+        Returns:
+            Dictionary mapping each key that has a result to the result
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._connection() as conn:
+            for i in range(0, len(keys), 300):
+                chunk = keys[i:i + 300]
+                values = ",".join("(?, ?, ?)" for _ in chunk)
+                rows = conn.execute(f"""
+                    SELECT before_hash, after_hash, settings_hash, result
+                    FROM comparison_results
+                    WHERE (before_hash, after_hash, settings_hash) IN (VALUES {values})
+                """, [part for key in chunk for part in key]).fetchall()
+                for row in rows:
+                    result = json.loads(row['result'])
+                    # Types were stored by name; restore them so stored and fresh results match
+                    for change in result.get('detailed_diff', {}).get('type_changes', {}).values():
+                        for field in ('old_type', 'new_type'):
+                            change[field] = _JSON_TYPES_BY_NAME.get(change[field], change[field])
+                    found[(row['before_hash'], row['after_hash'], row['settings_hash'])] = result
+        return found
+    
+    def save_comparisons(self, results: Dict[Tuple[str, str, str], Dict]) -> int:
+        """
+        Persist comparison results in a single transaction
+        
+        Python types in a result (e.g. the old_type of a type change) are
+        stored by name.
+        
+        Args:
+            results: Dictionary mapping (before_hash, after_hash, settings_hash) to a result
+        
+        Returns:
+            Number of results saved
+        """
+        rows = [
+            (before_hash, after_hash, settings_hash, int(bool(result.get('identical'))),
+             json.dumps(result, default=lambda value: getattr(value, '__name__', str(value))))
+            for (before_hash, after_hash, settings_hash), result in results.items()
+        ]
+        if not rows:
+            return 0
+        with self._transaction() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO comparison_results
+                (before_hash, after_hash, settings_hash, identical, result)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+    
+    @cached_read('response_schemas')
+    def get_response_schema(self, config_id: int) -> Optional[Dict]:
+        """
+        Get the merged response schema of a configuration (None before any successful response)
+        
+        Only covers results up to the last update_response_schemas() call.
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT schema FROM response_schemas WHERE config_id = ?", (config_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def update_response_schemas(self, config_ids: Optional[Iterable[int]] = None,
+                                page_size: int = SUITE_IMPORT_CHUNK_SIZE) -> int:
+        """
+        Merge successful results saved since the last update into their configuration's schema
+        
+        Schemas are kept off the save path: each configuration remembers the
+        last result merged, so only newer ones are read, a page at a time,
+        with each distinct response parsed once per page and bodies loaded
+        one at a time. Spilled and other large bodies are included.
+        
+        Args:
+            config_ids: Configurations to update (default: all)
+            page_size: Results read per query
+        
+        Returns:
+            Number of results merged into the schemas
+        """
+        if config_ids is None:
+            config_ids = [config['id'] for config in self.get_all_configs()]
+        merged = 0
+        for config_id in config_ids:
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT schema, last_result_id FROM response_schemas WHERE config_id = ?", (config_id,)
+                ).fetchone()
+            schema = json.loads(row[0]) if row else {}
+            start_id = last_id = row[1] if row else 0
+            
+            while True:
+                with self._connection() as conn:
+                    rows = conn.execute("""
+                        SELECT id, response_hash, response_data FROM test_results
+                        WHERE config_id = ? AND id > ? AND status_code BETWEEN 200 AND 299
+                        ORDER BY id
+                        LIMIT ?
+                    """, (config_id, last_id, page_size)).fetchall()
+                    if not rows:
+                        break
+                    
+                    parsed = {}
+                    for result in rows:
+                        key = result['response_hash'] or result['id']
+                        if key not in parsed:
+                            parsed[key] = self._parse_response(self._load_response_text(conn, result))
+                        if parsed[key] is not _UNPARSABLE:
+                            infer_schema(parsed[key], schema)
+                            merged += 1
+                last_id = rows[-1]['id']
+            
+            if last_id == start_id:
+                continue
+            with self._transaction() as conn:
+                # Another process may have merged the same results meanwhile
+                current = conn.execute(
+                    "SELECT last_result_id FROM response_schemas WHERE config_id = ?", (config_id,)
+                ).fetchone()
+                if (current[0] if current else 0) != start_id:
+                    continue
+                conn.execute("""
+                    INSERT OR REPLACE INTO response_schemas (config_id, schema, last_result_id, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (config_id, json.dumps(schema, separators=(',', ':')), last_id))
+        self.read_cache.invalidate('response_schemas')
+        return merged
+    
+    @staticmethod
+    def _load_response_text(conn: sqlite3.Connection, result: sqlite3.Row) -> Optional[str]:
+        """Get the response body of a result row with response_hash and response_data"""
+        if result['response_data'] is not None or result['response_hash'] is None:
+            return result['response_data']
+        blob = conn.execute(
+            "SELECT codec, data FROM response_blobs WHERE hash = ?", (result['response_hash'],)
+        ).fetchone()
+        return decompress(blob['codec'], blob['data']).decode('utf-8', errors='replace') if blob else None
+    
+    def rebuild_response_schemas(self, config_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Rebuild response schemas from every stored successful result
+        
+        Returns:
+            Number of results merged into the schemas
+        """
+        if config_ids is None:
+            config_ids = [config['id'] for config in self.get_all_configs()]
+        config_ids = list(config_ids)
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM response_schemas WHERE config_id = ?", [(i,) for i in config_ids])
+        self.read_cache.invalidate('response_schemas')
+        return self.update_response_schemas(config_ids)
@@ -0,0 +1,257 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from api_manager import APIManager
+from config import LOAD_MAX_WORKERS
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram in the style of HdrHistogram
+    
+    Values are recorded in microseconds. Below 2**sub_bucket_bits every value
+    has its own bucket; above, each power of two is split into 2**(bits - 1)
+    buckets, so any recorded value is reported within 1 / 2**(bits - 1) of
+    its true value while memory grows only with the log of the range.
+    """
+    
+    def __init__(self, sub_bucket_bits: int = 8):
+        self.sub_bucket_bits = sub_bucket_bits
+        self._linear = 1 << sub_bucket_bits
+        self._half = self._linear >> 1
+        self.counts: Counter = Counter()
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.sum = 0
+    
+    def _index(self, value: int) -> int:
+        if value < self._linear:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self._linear + (shift - 1) * self._half + (value >> shift) - self._half
+    
+    def _highest_equivalent(self, index: int) -> int:
+        """Get the largest value that falls in a bucket"""
+        if index < self._linear:
+            return index
+        shift, offset = divmod(index - self._linear, self._half)
+        shift += 1
+        return ((offset + self._half + 1) << shift) - 1
+    
+    def record(self, seconds: float, count: int = 1):
+        """Record a latency given in seconds"""
+        value = max(0, int(round(seconds * 1_000_000)))
+        self.counts[self._index(value)] += count
+        self.total += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def merge(self, other: 'LatencyHistogram'):
+        """Add the values recorded in another histogram of the same precision"""
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms of different precision")
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.sum += other.sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+    
+    def percentile(self, percent: float) -> float:
+        """Get the latency in seconds at or below which percent of the values fall"""
+        if not self.total:
+            return 0.0
+        if percent >= 100:
+            return self.max / 1_000_000
+        target = max(1, int(-(-self.total * percent // 100)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max) / 1_000_000
+        return self.max / 1_000_000
+    
+    def mean(self) -> float:
+        """Get the mean latency in seconds"""
+        return self.sum / self.total / 1_000_000 if self.total else 0.0
+    
+    def iter_values(self) -> Iterator[Tuple[float, int]]:
+        """Iterate over (latency in seconds, count) per bucket, lowest first"""
+        for index in sorted(self.counts):
+            yield min(self._highest_equivalent(index), self.max) / 1_000_000, self.counts[index]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dictionary"""
+        return {
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "counts": {str(index): count for index, count in sorted(self.counts.items())},
+            "min": self.min,
+            "max": self.max,
+            "sum": self.sum
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LatencyHistogram':
+        """Restore a histogram written by to_dict()"""
+        histogram = cls(data["sub_bucket_bits"])
+        histogram.counts = Counter({int(index): count for index, count in data["counts"].items()})
+        histogram.total = sum(histogram.counts.values())
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        histogram.sum = data["sum"]
+        return histogram
+
+
+class LoadResult:
+    """Latencies and outcomes of one load run against one API version"""
+    
+    def __init__(self, histogram: LatencyHistogram, status_codes: Counter,
+                 duration: float, dropped: int = 0):
+        self.histogram = histogram
+        self.status_codes = status_codes
+        self.duration = duration
+        self.dropped = dropped
+    
+    @property
+    def requests(self) -> int:
+        return self.histogram.total
+    
+    @property
+    def errors(self) -> int:
+        """Requests that got no response or a 5xx response"""
+        return sum(count for code, count in self.status_codes.items() if code == 0 or code >= 500)
+    
+    def summary(self) -> Dict[str, Any]:
+        """Get throughput, error counts and latency percentiles in seconds"""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "duration": self.duration,
+            "throughput": self.requests / self.duration if self.duration else 0.0,
+            "p50": self.histogram.percentile(50),
+            "p90": self.histogram.percentile(90),
+            "p99": self.histogram.percentile(99),
+            "max": self.histogram.percentile(100),
+            "mean": self.histogram.mean(),
+            "status_codes": {str(code): count for code, count in sorted(self.status_codes.items())}
+        }
+
+
+class LoadGenerator:
+    """
+    Drives one request repeatedly for a fixed duration
+    
+    With a concurrency, that many workers each send the next request as soon
+    as the previous one completes (closed loop). With a rate, requests are
+    started on a fixed schedule regardless of how fast responses come back
+    (open loop), and latency is measured from each request's scheduled start,
+    so a stalled server cannot hide its queueing delay by slowing the sender.
+    """
+    
+    def __init__(self, api_manager: APIManager, max_workers: int = LOAD_MAX_WORKERS):
+        self.api_manager = api_manager
+        self.max_workers = max_workers
+    
+    def run(self, config: Dict, payload: Dict = None, query_params: str = "",
+            duration: float = 10.0, rate: Optional[float] = None,
+            concurrency: Optional[int] = None, start_at: Optional[float] = None) -> LoadResult:
+        """
+        Load one API configuration
+        
+        Args:
+            config: API configuration dictionary
+            payload: Request payload (for POST, PUT)
+            query_params: Query parameters string (for GET)
+            duration: Seconds to keep sending requests
+            rate: Target requests per second (open loop)
+            concurrency: Number of concurrent requests (closed loop), used when rate is not given
+            start_at: perf_counter() time to start at, to line up runs against several versions
+        
+        Returns:
+            LoadResult with the latency histogram and status code counts
+        """
+        if rate is None and not concurrency:
+            raise ValueError("Either a rate or a concurrency is required")
+        if rate is not None and rate <= 0:
+            raise ValueError(f"The rate must be positive, got {rate:g} requests per second")
+        if start_at is not None:
+            time.sleep(max(0.0, start_at - perf_counter()))
+        if rate is not None:
+            return self._run_open(config, payload, query_params, duration, rate)
+        return self._run_closed(config, payload, query_params, duration, concurrency)
+    
+    def _run_closed(self, config: Dict, payload: Dict, query_params: str,
+                    duration: float, concurrency: int) -> LoadResult:
+        histograms = [LatencyHistogram() for _ in range(concurrency)]
+        status_codes = [Counter() for _ in range(concurrency)]
+        started = perf_counter()
+        deadline = started + duration
+        
+        def worker(histogram: LatencyHistogram, codes: Counter):
+            while perf_counter() < deadline:
+                request_started = perf_counter()
+                response = self.api_manager.execute_request(config, payload, query_params, retry=False)
+                histogram.record(perf_counter() - request_started)
+                codes[response['status_code']] += 1
+        
+        threads = [
+            threading.Thread(target=worker, args=(histograms[i], status_codes[i]), daemon=True)
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        return self._combine(histograms, status_codes, perf_counter() - started)
+    
+    def _run_open(self, config: Dict, payload: Dict, query_params: str,
+                  duration: float, rate: float) -> LoadResult:
+        histogram = LatencyHistogram()
+        codes = Counter()
+        lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.max_workers * 4)
+        dropped = 0
+        
+        def send(scheduled: float):
+            try:
+                response = self.api_manager.execute_request(config, payload, query_params, retry=False)
+                completed = perf_counter()
+                with lock:
+                    histogram.record(completed - scheduled)
+                    codes[response['status_code']] += 1
+            finally:
+                in_flight.release()
+        
+        interval = 1.0 / rate
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for sent in range(int(duration * rate)):
+                scheduled = started + sent * interval
+                delay = scheduled - perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                # Requests the backlog has no room for are counted, not queued forever
+                if not in_flight.acquire(blocking=False):
+                    dropped += 1
+                    continue
+                executor.submit(send, scheduled)
+        
+        return LoadResult(histogram, codes, perf_counter() - started, dropped)
+    
+    @staticmethod
+    def _combine(histograms: List[LatencyHistogram], status_codes: List[Counter],
+                 duration: float) -> LoadResult:
+        histogram = LatencyHistogram()
+        codes = Counter()
+        for part, part_codes in zip(histograms, status_codes):
+            histogram.merge(part)
+            codes.update(part_codes)
+        return LoadResult(histogram, codes, duration)
@@ -0,0 +1,156 @@
+import math
+import random
+from statistics import median
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from database import Database
+from config import (BEFORE_VERSION, AFTER_VERSION, REGRESSION_ALPHA, REGRESSION_MIN_CHANGE,
+                    REGRESSION_MIN_SAMPLES, REGRESSION_MAX_SAMPLES, REGRESSION_BOOTSTRAP_RESAMPLES)
+
+try:
+    import numpy
+except ImportError:  # optional dependency, the bootstrap then runs in pure Python
+    numpy = None
+
+REGRESSION = 'regression'
+IMPROVEMENT = 'improvement'
+NO_CHANGE = 'no change'
+INSUFFICIENT_DATA = 'insufficient data'
+
+
+class LatencyAnalysis(NamedTuple):
+    """Before/after latency comparison of one test case over all its stored runs"""
+    test_case_name: str
+    before_samples: int
+    after_samples: int
+    before_median: Optional[float]
+    after_median: Optional[float]
+    change: Optional[float]  # relative change of the median, e.g. 0.12 = 12% slower
+    ci_low: Optional[float]
+    ci_high: Optional[float]
+    p_value: Optional[float]
+    verdict: str
+
+
+def mann_whitney_u(sample1: Sequence[float], sample2: Sequence[float]) -> Tuple[float, float]:
+    """
+    Two-sided Mann-Whitney U test using the normal approximation
+    
+    Tied values get their average rank and the variance is corrected for
+    ties, so repeated identical timings are handled.
+    
+    Returns:
+        (U statistic of sample1, two-sided p-value)
+    """
+    n1, n2 = len(sample1), len(sample2)
+    combined = sorted([(value, 0) for value in sample1] + [(value, 1) for value in sample2])
+    
+    rank_sum = 0.0
+    tie_term = 0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        rank_sum += average_rank * sum(1 for k in range(i, j + 1) if combined[k][1] == 0)
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+    
+    u1 = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u1, 1.0
+    # Continuity correction toward the mean
+    z = (abs(u1 - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return u1, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def bootstrap_median_change(before: Sequence[float], after: Sequence[float],
+                            resamples: int = REGRESSION_BOOTSTRAP_RESAMPLES,
+                            confidence: float = 0.95, seed: int = 0) -> Tuple[float, float]:
+    """
+    Percentile bootstrap confidence interval of median(after) / median(before) - 1
+    
+    Uses numpy when it is installed; the seed makes the interval reproducible.
+    """
+    tail = (1 - confidence) / 2
+    if numpy is not None:
+        rng = numpy.random.default_rng(seed)
+        before_array = numpy.asarray(before, dtype=float)
+        after_array = numpy.asarray(after, dtype=float)
+        before_medians = numpy.median(rng.choice(before_array, (resamples, len(before_array))), axis=1)
+        after_medians = numpy.median(rng.choice(after_array, (resamples, len(after_array))), axis=1)
+        changes = after_medians / numpy.maximum(before_medians, 1e-12) - 1
+        low, high = numpy.quantile(changes, [tail, 1 - tail])
+        return float(low), float(high)
+    
+    rng = random.Random(seed)
+    changes = sorted(
+        median(rng.choices(after, k=len(after))) / max(median(rng.choices(before, k=len(before))), 1e-12) - 1
+        for _ in range(resamples)
+    )
+    return changes[int(tail * (resamples - 1))], changes[int(math.ceil((1 - tail) * (resamples - 1)))]
+
+
+class RegressionAnalyzer:
+    """
+    Flags test cases whose latency changed between versions beyond noise
+    
+    All stored executions of a case are used, not just the latest. A change
+    is reported when the Mann-Whitney test rejects "same distribution" at
+    alpha and the bootstrap confidence interval of the median change lies
+    entirely beyond min_change, so tiny but consistent shifts are ignored.
+    """
+    
+    def __init__(self, db: Database, alpha: float = REGRESSION_ALPHA,
+                 min_change: float = REGRESSION_MIN_CHANGE,
+                 min_samples: int = REGRESSION_MIN_SAMPLES,
+                 max_samples: int = REGRESSION_MAX_SAMPLES,
+                 resamples: int = REGRESSION_BOOTSTRAP_RESAMPLES):
+        self.db = db
+        self.alpha = alpha
+        self.min_change = min_change
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.resamples = resamples
+    
+    def analyze(self, test_case_name: str, before: Sequence[float],
+                after: Sequence[float]) -> LatencyAnalysis:
+        """Compare the latency samples of one test case"""
+        before_median = median(before) if before else None
+        after_median = median(after) if after else None
+        if len(before) < self.min_samples or len(after) < self.min_samples:
+            return LatencyAnalysis(test_case_name, len(before), len(after), before_median,
+                                   after_median, None, None, None, None, INSUFFICIENT_DATA)
+        
+        _, p_value = mann_whitney_u(before, after)
+        change = after_median / before_median - 1 if before_median else None
+        ci_low, ci_high = bootstrap_median_change(before, after, self.resamples)
+        
+        verdict = NO_CHANGE
+        if p_value < self.alpha:
+            if ci_low > self.min_change:
+                verdict = REGRESSION
+            elif ci_high < -self.min_change:
+                verdict = IMPROVEMENT
+        return LatencyAnalysis(test_case_name, len(before), len(after), before_median,
+                               after_median, change, ci_low, ci_high, p_value, verdict)
+    
+    def analyze_task(self, task_name: str, test_case_name: Optional[str] = None) -> List[LatencyAnalysis]:
+        """
+        Analyze every test case of a task (or just one) from its stored latencies
+        
+        Returns:
+            One LatencyAnalysis per test case, ordered by test case name
+        """
+        samples = self.db.get_latency_samples(task_name, test_case_name, self.max_samples)
+        cases: Dict[str, Dict[str, List[float]]] = {}
+        for (case_name, version), latencies in samples.items():
+            cases.setdefault(case_name, {})[version] = latencies
+        
+        return [
+            self.analyze(case_name, versions.get(BEFORE_VERSION, []), versions.get(AFTER_VERSION, []))
+            for case_name, versions in sorted(cases.items())
+        ]
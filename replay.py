@@ -0,0 +1,315 @@
+import hashlib
+import json
+import queue
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+from capture import CapturedBody
+from database import Database
+from config import REPLAY_CACHE_SIZE, RECORD_QUEUE_SIZE, RECORD_BATCH_SIZE
+
+try:
+    import httpx
+except ImportError:  # optional dependency, only needed to replay through the async backend
+    httpx = None
+
+# Bodies are stored decoded, so these would no longer describe them
+_REPLAY_DROPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'connection'}
+_REDACTED_HEADERS = {'authorization', 'proxy-authorization', 'cookie'}
+
+
+def _canonical_url(url: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', parts.query, ''))
+
+
+def _canonical_body(body: Union[bytes, str, None]) -> bytes:
+    """JSON bodies are keyed by content, not by how they happen to be serialized"""
+    if not body:
+        return b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode('utf-8')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return body
+
+
+def request_key(method: str, url: str, body: Union[bytes, str, None] = None) -> str:
+    """Get the key an exchange is recorded and looked up under: method, URL and body"""
+    digest = hashlib.sha256()
+    digest.update(method.upper().encode('ascii'))
+    digest.update(b'\0' + _canonical_url(url).encode('utf-8') + b'\0')
+    digest.update(_canonical_body(body))
+    return digest.hexdigest()
+
+
+def replay_headers(exchange: Dict[str, Any]) -> Dict[str, str]:
+    """Get the recorded response headers to send with the stored (decoded) body"""
+    headers = {
+        name: value for name, value in exchange['response_headers'].items()
+        if name.lower() not in _REPLAY_DROPPED_HEADERS
+    }
+    headers['Content-Length'] = str(len(exchange['response_body']))
+    return headers
+
+
+class ReplayMiss(requests.exceptions.RequestException):
+    """No exchange was recorded for a request"""
+
+
+class ExchangeRecorder:
+    """
+    Saves every request APIManager sends, with the raw response, to the database
+    
+    Response bodies go to the shared blob store, so recording the same
+    response many times costs one compressed copy. Credentials in request
+    headers are redacted.
+    
+    record() only queues the exchange; a writer thread saves the queue in
+    batches, so requests never wait on SQLite. Call close() to save what is
+    still queued.
+    """
+    
+    def __init__(self, db: Database, queue_size: int = RECORD_QUEUE_SIZE,
+                 batch_size: int = RECORD_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.exchanges: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.counts = dict.fromkeys(('recorded', 'failed'), 0)
+        self._writer = threading.Thread(target=self._write_worker, daemon=True)
+        self._writer.start()
+    
+    def record(self, config: Dict, method: str, url: str, request_headers: Dict[str, str],
+               request_body: Union[bytes, str, None], status_code: int,
+               response_headers: Dict[str, str], response_body: Union[bytes, CapturedBody],
+               response_time: float, timings: Optional[Dict[str, float]] = None,
+               block: bool = True) -> bool:
+        """
+        Queue one exchange to be saved
+        
+        A captured body is read by the writer thread, not the caller. The
+        call only waits when the writer is queue_size exchanges behind,
+        and then only if block is set.
+        
+        Returns:
+            Whether the exchange was queued
+        """
+        try:
+            self.exchanges.put((config, method, url, request_headers, request_body, status_code,
+                                response_headers, response_body, response_time, timings), block=block)
+        except queue.Full:
+            return False
+        return True
+    
+    @staticmethod
+    def _exchange(config: Dict, method: str, url: str, request_headers: Dict[str, str],
+                  request_body: Union[bytes, str, None], status_code: int,
+                  response_headers: Dict[str, str], response_body: Union[bytes, CapturedBody],
+                  response_time: float, timings: Optional[Dict[str, float]]) -> Dict[str, Any]:
+        """Build the row of one exchange, redacting credentials"""
+        secret_headers = set(_REDACTED_HEADERS)
+        auth_details = json.loads(config.get('auth_details') or '{}')
+        if auth_details.get('type') == 'api_key':
+            secret_headers.add(auth_details['key_name'].lower())
+        
+        if isinstance(request_body, str):
+            request_body = request_body.encode('utf-8')
+        if isinstance(response_body, CapturedBody):
+            response_body = response_body.read_bytes()
+        return {
+            "request_key": request_key(method, url, request_body),
+            "config_id": config.get('id'),
+            "method": method.upper(),
+            "url": url,
+            "request_headers": {
+                name: '[redacted]' if name.lower() in secret_headers else value
+                for name, value in request_headers.items()
+            },
+            "request_body": request_body,
+            "status_code": status_code,
+            "response_headers": response_headers,
+            "response_body": response_body,
+            "response_time": response_time,
+            "timings": timings
+        }
+    
+    def _write_worker(self):
+        while True:
+            # Save in batches while traffic is heavy, right away when it is not
+            items = [self.exchanges.get()]
+            while items[-1] is not None and len(items) < self.batch_size:
+                try:
+                    items.append(self.exchanges.get_nowait())
+                except queue.Empty:
+                    break
+            stop = items[-1] is None
+            batch = [item for item in items if item is not None]
+            
+            rows: List[Dict[str, Any]] = []
+            for item in batch:
+                try:
+                    rows.append(self._exchange(*item))
+                except Exception:
+                    self.counts['failed'] += 1
+            if rows:
+                try:
+                    self.db.save_recorded_exchanges(rows)
+                    self.counts['recorded'] += len(rows)
+                except Exception:
+                    # A failed save must not stop recording
+                    self.counts['failed'] += len(rows)
+            if stop:
+                break
+    
+    def close(self):
+        """Save the queued exchanges and stop the writer thread"""
+        if self._writer.is_alive():
+            self.exchanges.put(None)
+            self._writer.join()
+
+
+class ReplayStore:
+    """
+    Looks up recorded exchanges, keeping recently used ones in memory
+    
+    The latest recording of a request wins. preload() reads a whole
+    configuration's recordings in one pass so replay never waits on SQLite.
+    """
+    
+    def __init__(self, db: Database, cache_size: int = REPLAY_CACHE_SIZE):
+        self.db = db
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _remember(self, key: str, exchange: Dict[str, Any]):
+        with self._lock:
+            self._cache[key] = exchange
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def lookup(self, method: str, url: str, body: Union[bytes, str, None] = None) -> Optional[Dict[str, Any]]:
+        """Get the recorded exchange for a request (None if it was never recorded)"""
+        key = request_key(method, url, body)
+        with self._lock:
+            exchange = self._cache.get(key)
+            if exchange is not None:
+                self._cache.move_to_end(key)
+                return exchange
+        
+        exchange = self.db.get_recorded_exchange(key)
+        if exchange is not None:
+            self._remember(key, exchange)
+        return exchange
+    
+    def preload(self, config_id: Optional[int] = None) -> int:
+        """Load the recordings of a configuration (or all) into memory, up to cache_size"""
+        loaded = 0
+        for exchange in self.db.iter_recorded_exchanges(config_id):
+            self._remember(exchange['request_key'], exchange)
+            loaded += 1
+        return loaded
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Transport adapter answering requests from recorded exchanges instead of the network"""
+    
+    def __init__(self, store: ReplayStore):
+        super().__init__()
+        self.store = store
+    
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        exchange = self.store.lookup(request.method, request.url, request.body)
+        if exchange is None:
+            raise ReplayMiss(f"No recorded response for {request.method} {request.url}", request=request)
+        raw = HTTPResponse(
+            body=BytesIO(exchange['response_body']),
+            headers=replay_headers(exchange),
+            status=exchange['status_code'],
+            preload_content=False
+        )
+        return self.build_response(request, raw)
+
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport if httpx is not None else object):
+    """httpx transport answering requests from recorded exchanges, for the async backend"""
+    
+    def __init__(self, store: ReplayStore):
+        self.store = store
+    
+    async def handle_async_request(self, request: 'httpx.Request') -> 'httpx.Response':
+        body = await request.aread()
+        exchange = self.store.lookup(request.method, str(request.url), body)
+        if exchange is None:
+            raise ReplayMiss(f"No recorded response for {request.method} {request.url}")
+        return httpx.Response(
+            exchange['status_code'],
+            headers=replay_headers(exchange),
+            content=exchange['response_body'],
+            request=request
+        )
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering as one API configuration from its recordings
+    
+    Request paths are resolved against the configuration's recorded host,
+    so pointing any HTTP client at the server replays that version offline.
+    Unrecorded requests get a 404 with a JSON error body.
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, store: ReplayStore, config: Dict, host: str = '127.0.0.1', port: int = 0):
+        parts = urlsplit(config['api_url'])
+        self.store = store
+        self.config = config
+        self.upstream = f"{parts.scheme}://{parts.netloc}"
+        super().__init__((host, port), _ReplayHandler)
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def _replay(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        url = self.server.upstream + self.path
+        exchange = self.server.store.lookup(self.command, url, body)
+        
+        if exchange is None:
+            status = 404
+            headers = {'Content-Type': 'application/json'}
+            payload = json.dumps({"error": f"No recorded response for {self.command} {url}"}).encode('utf-8')
+            headers['Content-Length'] = str(len(payload))
+        else:
+            status = exchange['status_code']
+            headers = replay_headers(exchange)
+            payload = exchange['response_body']
+        
+        self.send_response(status)
+        for name, value in headers.items():
+            # send_response() has written its own
+            if name.lower() not in ('server', 'date'):
+                self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    do_GET = do_POST = do_PUT = do_DELETE = _replay
+    
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,131 @@
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+from config import (MAX_RETRIES, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX, RETRY_STATUS_CODES,
+                    RETRY_METHODS, RATE_LIMIT_PER_HOST, RATE_LIMIT_BURST)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Get the seconds to wait from a Retry-After header (delay seconds or an HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Decides whether and how long to wait before retrying a failed attempt
+    
+    Timeouts, connection errors and the retryable status codes are retried
+    up to max_retries times. The wait is drawn uniformly between zero and an
+    exponentially growing cap ("full jitter"), so concurrent workers that
+    failed together do not retry together. A Retry-After header is honored;
+    if it asks for longer than backoff_max the response is kept instead.
+    
+    A request that timed out or got a 5xx may already have been applied
+    upstream, so only the given methods (by default the safe ones) are
+    retried on those. Any method is retried on a 429, which the server
+    sends instead of processing the request.
+    """
+    
+    def __init__(self, max_retries: int = MAX_RETRIES, backoff_base: float = RETRY_BACKOFF_BASE,
+                 backoff_max: float = RETRY_BACKOFF_MAX,
+                 status_codes: Iterable[int] = RETRY_STATUS_CODES,
+                 methods: Iterable[str] = RETRY_METHODS, seed: Optional[int] = None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.status_codes = frozenset(status_codes)
+        self.methods = frozenset(method.upper() for method in methods)
+        self._random = random.Random(seed)
+    
+    def backoff(self, attempt: int, failed: bool, status_code: int = 0,
+                headers: Optional[Dict[str, str]] = None, method: Optional[str] = None) -> Optional[float]:
+        """
+        Get the seconds to wait before the next attempt
+        
+        Args:
+            attempt: Number of the attempt that just finished, starting at 1
+            failed: Whether the attempt got no response (timeout or connection error)
+            status_code: Status code of the response, if any
+            headers: Headers of the response, if any
+            method: HTTP method of the request; None counts as retryable
+        
+        Returns:
+            Seconds to wait, or None if the result should be kept
+        """
+        if attempt > self.max_retries:
+            return None
+        if not failed and status_code not in self.status_codes:
+            return None
+        if method is not None and method.upper() not in self.methods and (failed or status_code != 429):
+            return None
+        
+        delay = self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        retry_after = parse_retry_after((headers or {}).get('Retry-After') or
+                                        (headers or {}).get('retry-after'))
+        if retry_after is not None:
+            if retry_after > self.backoff_max:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to burst requests"""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self) -> float:
+        """
+        Take a token, returning the seconds the caller must wait before using it
+        
+        Tokens may be taken ahead of time, so concurrent callers are spread
+        out one interval apart instead of all waking at once.
+        """
+        with self._lock:
+            now = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class HostRateLimiter:
+    """Token bucket per host; a rate of 0 disables limiting"""
+    
+    def __init__(self, rate: float = RATE_LIMIT_PER_HOST, burst: int = RATE_LIMIT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+    
+    def reserve(self, url: str) -> float:
+        """Take a token for the URL's host, returning the seconds to wait before sending"""
+        if self.rate <= 0:
+            return 0.0
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+        return bucket.reserve()
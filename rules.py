@@ -0,0 +1,347 @@
+import hashlib
+import json
+import re
+from fnmatch import fnmatchcase
+from typing import Dict, Any, List, Optional, Tuple, FrozenSet, NamedTuple, Pattern
+
+# Segment kinds of a compiled path pattern
+KEY = 'key'          # exact object key
+GLOB = 'glob'        # object key matched with fnmatch (e.g. "trace_*")
+INDEX = 'index'      # exact array index
+ANY = 'any'          # "*": any single key or index
+ANY_INDEX = 'any_index'  # "[*]": any array index
+DEEP = 'deep'        # "**": any number of segments, including none
+
+LIST_MODES = ('ordered', 'unordered')
+
+_TOKEN = re.compile(r"""
+    \[\s*(?P<bracket>\*|\d+|'[^']*'|"[^"]*")\s*\]   # [*], [0], ['key']
+    | \.?(?P<name>[^.\[\]]+)                       # key, *, **, glob
+""", re.VERBOSE)
+
+
+def parse_path(pattern: str) -> List[Tuple[str, Any]]:
+    """
+    Parse a path pattern into segments
+    
+    Accepts dotted paths with JSONPath-like extras, with or without a
+    leading "$" or "root": "data.flights", "$.data.flights[*].id",
+    "**.trace_*", "root['items'][0]".
+    """
+    text = pattern.strip()
+    for prefix in ('$', 'root'):
+        if text == prefix or text.startswith((prefix + '.', prefix + '[')):
+            text = text[len(prefix):]
+            break
+    
+    segments = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid path pattern: {pattern!r}")
+        position = match.end()
+        
+        bracket, name = match.group('bracket'), match.group('name')
+        if bracket is not None:
+            if bracket == '*':
+                segments.append((ANY_INDEX, None))
+            elif bracket.isdigit():
+                segments.append((INDEX, int(bracket)))
+            else:
+                segments.append((KEY, bracket[1:-1]))
+        elif name == '**':
+            segments.append((DEEP, None))
+        elif name == '*':
+            segments.append((ANY, None))
+        elif any(c in name for c in '*?['):
+            segments.append((GLOB, name))
+        else:
+            segments.append((KEY, name))
+    return segments
+
+
+def _segment_matches(segment: Tuple[str, Any], step: Any) -> bool:
+    """Check whether one pattern segment accepts one path step (key or index)"""
+    kind, value = segment
+    if kind == ANY or kind == DEEP:
+        return True
+    if isinstance(step, int) and not isinstance(step, bool):
+        return kind == ANY_INDEX or (kind == INDEX and value == step)
+    if kind == KEY:
+        return value == step
+    if kind == GLOB:
+        return fnmatchcase(str(step), value)
+    return False
+
+
+class PathMatcher:
+    """
+    Set of path patterns compiled into a state machine
+    
+    A walk starts from ``start`` and calls ``step`` for every key or index it
+    descends into. States are cached per (state, step), and an empty state
+    means no pattern can match anywhere below, so the walk can stop asking.
+    """
+    
+    MAX_CACHED_STEPS = 100_000
+    
+    def __init__(self, patterns: List[Tuple[str, Any]]):
+        """
+        Args:
+            patterns: List of (pattern, value) pairs; earlier patterns win
+        """
+        self.patterns = [parse_path(pattern) for pattern, _ in patterns]
+        self.values = [value for _, value in patterns]
+        self.start = self._closure({(i, 0) for i in range(len(self.patterns))})
+        self._steps = {}
+    
+    def _closure(self, positions) -> FrozenSet[Tuple[int, int]]:
+        """Add the positions reachable by letting "**" match nothing"""
+        pending = list(positions)
+        closed = set(pending)
+        while pending:
+            i, pos = pending.pop()
+            segments = self.patterns[i]
+            if pos < len(segments) and segments[pos][0] == DEEP and (i, pos + 1) not in closed:
+                closed.add((i, pos + 1))
+                pending.append((i, pos + 1))
+        return frozenset(closed)
+    
+    def step(self, state: FrozenSet[Tuple[int, int]], step: Any) -> FrozenSet[Tuple[int, int]]:
+        """Advance a state by one key or index"""
+        if not state:
+            return state
+        
+        cache_key = (state, type(step), step)
+        cached = self._steps.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        positions = set()
+        for i, pos in state:
+            segments = self.patterns[i]
+            if pos < len(segments) and _segment_matches(segments[pos], step):
+                if segments[pos][0] == DEEP:
+                    positions.add((i, pos))
+                else:
+                    positions.add((i, pos + 1))
+        result = self._closure(positions)
+        
+        if len(self._steps) >= self.MAX_CACHED_STEPS:
+            self._steps.clear()
+        self._steps[cache_key] = result
+        return result
+    
+    def matches(self, state: FrozenSet[Tuple[int, int]]) -> List[Any]:
+        """Get the values of all patterns that end at this state, earliest first"""
+        ended = sorted(i for i, pos in state if pos == len(self.patterns[i]))
+        return [self.values[i] for i in ended]
+
+
+def parse_list_mode(mode: str) -> Tuple[str, Optional[str]]:
+    """
+    Parse a list comparison mode
+    
+    Returns:
+        ("ordered", None), ("unordered", None) or ("keyed", field) for "key:<field>"
+    """
+    mode = mode.strip()
+    if mode.startswith('key:') and mode[4:].strip():
+        return 'keyed', mode[4:].strip()
+    if mode in LIST_MODES:
+        return mode, None
+    raise ValueError(f"Unknown list mode: {mode!r} (use 'ordered', 'unordered' or 'key:<field>')")
+
+
+def parse_tolerance(spec: Any) -> Tuple[float, float]:
+    """
+    Parse a numeric tolerance
+    
+    Returns:
+        (absolute, relative) tolerance; a bare number is an absolute tolerance
+    """
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        return float(spec), 0.0
+    if isinstance(spec, dict) and set(spec) <= {'absolute', 'relative'} and \
+            all(_is_number(value) for value in spec.values()):
+        return float(spec.get('absolute', 0)), float(spec.get('relative', 0))
+    raise ValueError(f"Invalid tolerance: {spec!r} (use a number or {{'absolute': .., 'relative': ..}})")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_settings(settings: Any):
+    """Check the JSON types of a settings dictionary, raising ValueError"""
+    if not isinstance(settings, dict):
+        raise ValueError(f"Settings must be an object, got {type(settings).__name__}")
+    _check_setting(settings, "list_modes", dict, str)
+    _check_setting(settings, "ignore", list, str)
+    _check_setting(settings, "tolerances", dict, None)
+    _check_setting(settings, "normalizers", list, dict)
+
+
+def _check_setting(settings: Dict[str, Any], name: str, container: type, item: Optional[type]):
+    """Check the JSON types of one settings entry and of its values"""
+    value = settings.get(name)
+    if value is None:
+        return
+    kind = "an object" if container is dict else "a list"
+    if not isinstance(value, container):
+        raise ValueError(f"\"{name}\" must be {kind}, got {type(value).__name__}")
+    values = value.values() if container is dict else value
+    if item is not None and not all(isinstance(v, item) for v in values):
+        raise ValueError(f"\"{name}\" must be {kind} of {'strings' if item is str else 'objects'}")
+
+
+class _NodeRules(NamedTuple):
+    """Everything the rules say about one path, resolved once per matcher state"""
+    ignored: bool
+    list_mode: Tuple[str, Optional[str]]
+    tolerance: Optional[Tuple[float, float]]
+    normalizers: Tuple[Tuple[Pattern, str], ...]
+
+
+_NO_RULES = _NodeRules(False, ('ordered', None), None, ())
+
+
+class ComparisonRules:
+    """
+    Per-task comparison settings compiled once for use during the diff walk
+    
+    All path patterns are compiled into one PathMatcher, so the walk keeps a
+    single state per node and stops matching below paths no rule can reach.
+    Ignored paths are pruned as the walk reaches them, before their subtrees
+    are compared.
+    
+    Settings format (stored per task as JSON)::
+    
+        {
+            "list_modes": {"flights": "unordered", "data.items": "key:id"},
+            "ignore": ["**.timestamp", "meta.request_id", "headers.x-trace-*"],
+            "tolerances": {"**.price": 0.01, "stats.*": {"relative": 0.05}},
+            "normalizers": [
+                {"path": "**.url", "pattern": "sessionid=[^&]+", "replace": "sessionid=*"}
+            ]
+        }
+    """
+    
+    def __init__(self, list_modes: Optional[Dict[str, str]] = None,
+                 ignore: Optional[List[str]] = None,
+                 tolerances: Optional[Dict[str, Any]] = None,
+                 normalizers: Optional[List[Dict[str, str]]] = None):
+        self.settings = {
+            "list_modes": dict(list_modes or {}),
+            "ignore": list(ignore or []),
+            "tolerances": dict(tolerances or {}),
+            "normalizers": list(normalizers or [])
+        }
+        
+        entries = []
+        for pattern in self.settings["ignore"]:
+            entries.append((pattern, ('ignore', True)))
+        for pattern, mode in self.settings["list_modes"].items():
+            entries.append((pattern, ('list_mode', parse_list_mode(mode))))
+        for pattern, spec in self.settings["tolerances"].items():
+            entries.append((pattern, ('tolerance', parse_tolerance(spec))))
+        for normalizer in self.settings["normalizers"]:
+            try:
+                regex = re.compile(normalizer['pattern'])
+            except (KeyError, TypeError, re.error) as e:
+                raise ValueError(f"Invalid normalizer {normalizer!r}: {e}")
+            if not all(isinstance(normalizer.get(key, ''), str) for key in ('path', 'replace')):
+                raise ValueError(f"Invalid normalizer {normalizer!r}: \"path\" and \"replace\" must be strings")
+            entries.append((
+                normalizer.get('path', '**'),
+                ('normalize', (regex, normalizer.get('replace', '')))
+            ))
+        
+        self.matcher = PathMatcher(entries)
+        self.start = self.matcher.start
+        self._resolved = {}
+    
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]]) -> 'ComparisonRules':
+        """Compile rules from a settings dictionary, raising ValueError if it is malformed"""
+        settings = settings or {}
+        _check_settings(settings)
+        return cls(
+            list_modes=settings.get("list_modes"),
+            ignore=settings.get("ignore"),
+            tolerances=settings.get("tolerances"),
+            normalizers=settings.get("normalizers")
+        )
+    
+    def merged(self, settings: Optional[Dict[str, Any]]) -> 'ComparisonRules':
+        """Compile these rules plus extra settings, e.g. a test case's own masks (ValueError if malformed)"""
+        if not settings:
+            return self
+        _check_settings(settings)
+        return ComparisonRules(
+            list_modes={**self.settings["list_modes"], **settings.get("list_modes", {})},
+            ignore=self.settings["ignore"] + list(settings.get("ignore", [])),
+            tolerances={**self.settings["tolerances"], **settings.get("tolerances", {})},
+            normalizers=self.settings["normalizers"] + list(settings.get("normalizers", []))
+        )
+    
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of the settings, e.g. to key results computed with these rules"""
+        text = json.dumps(self.settings, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    @property
+    def empty(self) -> bool:
+        """Whether the rules change nothing about a plain comparison"""
+        return not self.matcher.patterns
+    
+    def step(self, state: FrozenSet[Tuple[int, int]], step: Any) -> FrozenSet[Tuple[int, int]]:
+        """Advance the walk state into a child key or index"""
+        return self.matcher.step(state, step)
+    
+    def at(self, state: FrozenSet[Tuple[int, int]]) -> _NodeRules:
+        """Resolve the rules that apply at a matcher state"""
+        if not state:
+            return _NO_RULES
+        resolved = self._resolved.get(state)
+        if resolved is None:
+            ignored = False
+            list_mode = None
+            tolerance = None
+            normalizers = []
+            for kind, value in self.matcher.matches(state):
+                if kind == 'ignore':
+                    ignored = True
+                elif kind == 'list_mode' and list_mode is None:
+                    list_mode = value
+                elif kind == 'tolerance' and tolerance is None:
+                    tolerance = value
+                elif kind == 'normalize':
+                    normalizers.append(value)
+            resolved = _NodeRules(ignored, list_mode or ('ordered', None), tolerance, tuple(normalizers))
+            self._resolved[state] = resolved
+        return resolved
+    
+    def ignored(self, state: FrozenSet[Tuple[int, int]]) -> bool:
+        """Whether the path at this state is masked out of comparisons"""
+        return self.at(state).ignored
+    
+    def list_mode(self, state: FrozenSet[Tuple[int, int]]) -> Tuple[str, Optional[str]]:
+        """Get the list comparison mode for the array at this state"""
+        return self.at(state).list_mode
+    
+    def scalars_equal(self, state: FrozenSet[Tuple[int, int]], value1: Any, value2: Any) -> bool:
+        """Whether two differing scalars count as equal under tolerances and normalizers"""
+        node_rules = self.at(state)
+        if node_rules.tolerance and _is_number(value1) and _is_number(value2):
+            absolute, relative = node_rules.tolerance
+            delta = abs(value1 - value2)
+            return delta <= absolute or delta <= relative * max(abs(value1), abs(value2))
+        if node_rules.normalizers and isinstance(value1, str) and isinstance(value2, str):
+            for regex, replacement in node_rules.normalizers:
+                value1 = regex.sub(replacement, value1)
+                value2 = regex.sub(replacement, value2)
+            return value1 == value2
+        return False
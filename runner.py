@@ -0,0 +1,217 @@
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from operator import getitem
+from time import perf_counter
+from typing import Dict, Any, Optional, Tuple, Iterable, Iterator
+from api_manager import APIManager
+from database import Database
+from comparator import ResponseComparator
+from capture import storage_fields
+from rules import ComparisonRules
+from load_test import LoadGenerator
+from config import BEFORE_VERSION, AFTER_VERSION, SUITE_CHUNK_SIZE, LOAD_DEFAULT_DURATION
+
+class PairedRunner:
+    """Runs test cases against both versions of a task side-by-side"""
+    
+    def __init__(self, db: Database, api_manager: APIManager, comparator: ResponseComparator):
+        self.db = db
+        self.api_manager = api_manager
+        self.comparator = comparator
+    
+    def get_config_pair(self, task_name: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Get the (before, after) configurations of a task"""
+        configs = self.db.get_configs_by_task(task_name)
+        before = next((c for c in configs if c['api_version'] == BEFORE_VERSION), None)
+        after = next((c for c in configs if c['api_version'] == AFTER_VERSION), None)
+        return before, after
+    
+    def get_rules(self, task_name: str) -> ComparisonRules:
+        """Compile the saved comparison settings of a task"""
+        return ComparisonRules.from_settings(self.db.get_comparison_settings(task_name))
+    
+    def run_pair(self, task_name: str, test_case_name: str, payload: Dict = None,
+                 query_params: str = "") -> Dict[str, Any]:
+        """
+        Execute a test case against both versions at the same time
+        
+        Both results are saved under one run ID and compared directly,
+        without reading them back from the database.
+        
+        Args:
+            task_name: Task whose "Before Change" and "After Change" configs are used
+            test_case_name: Name to store the results under
+            payload: Request payload (for POST, PUT)
+            query_params: Query parameters string (for GET)
+        
+        Returns:
+            Dictionary with the run ID, both responses and the comparison
+        """
+        case = {"name": test_case_name, "payload": payload, "query_params": query_params}
+        return next(self.run_suite(task_name, [case], max_workers=2))
+    
+    def get_stored_cases(self, task_name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Get the test cases of a task
+        
+        Imported suite cases are used when the task has any; otherwise each
+        test case's latest stored request is replayed.
+        """
+        if self.db.count_test_cases(task_name):
+            yield from self.db.iter_test_cases(task_name)
+            return
+        
+        for request in self.db.get_latest_requests(task_name, BEFORE_VERSION):
+            payload = request['request_payload']
+            yield {
+                "name": request['test_case_name'],
+                "payload": json.loads(payload) if payload else None,
+                "query_params": request['query_params'] or ""
+            }
+    
+    def run_suite(self, task_name: str, cases: Iterable[Dict[str, Any]], max_workers: int = None,
+                  max_per_host: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Execute many test cases against both versions concurrently
+        
+        Cases are consumed lazily, SUITE_CHUNK_SIZE at a time. The before and
+        after requests of a case are submitted back to back so they run at
+        the same time, and each chunk is saved in one transaction before its
+        comparisons are yielded.
+        
+        Args:
+            task_name: Task whose "Before Change" and "After Change" configs are used
+            cases: Dictionaries with a "name" and optional "payload", "query_params"
+                and "rules" (settings merged over the task's for that case only)
+            max_workers: Maximum number of requests in flight
+            max_per_host: Maximum number of requests in flight per host
+        
+        Returns:
+            Iterator of dictionaries with the test case name, run ID, both
+            responses and the comparison, in the order of cases
+        """
+        before_config, after_config = self.get_config_pair(task_name)
+        if not before_config or not after_config:
+            raise ValueError(
+                f"Task '{task_name}' needs both '{BEFORE_VERSION}' and '{AFTER_VERSION}' configurations"
+            )
+        rules = self.get_rules(task_name)
+        # Cases often share masks, so each distinct set is compiled once
+        case_rules = {}
+        
+        cases = iter(cases)
+        while True:
+            chunk = list(islice(cases, SUITE_CHUNK_SIZE))
+            if not chunk:
+                return
+            
+            jobs = (
+                (config, case.get('payload'), case.get('query_params') or "")
+                for case in chunk
+                for config in (before_config, after_config)
+            )
+            responses = iter(list(self.api_manager.iter_execute(jobs, max_workers, max_per_host)))
+            runs = [
+                (case, uuid.uuid4().hex, before, after)
+                for case, before, after in zip(chunk, responses, responses)
+            ]
+            
+            pairs = []
+            for case, run_id, before, after in runs:
+                rules_key = json.dumps(case.get('rules'), sort_keys=True)
+                if rules_key not in case_rules:
+                    case_rules[rules_key] = rules.merged(case.get('rules'))
+                # Bodies are only parsed for pairs without a stored result
+                pairs.append((partial(getitem, before, 'body'), partial(getitem, after, 'body'),
+                              before['body_hash'], after['body_hash'], case_rules[rules_key]))
+            
+            # Pairs whose responses and rules are unchanged since a previous run are not diffed again
+            comparisons = self.comparator.compare_many(pairs)
+            
+            self.db.save_test_results_bulk(
+                {
+                    "config_id": config['id'],
+                    "test_case_name": case['name'],
+                    "request_payload": json.dumps(case.get('payload')),
+                    **storage_fields(response),
+                    "status_code": response['status_code'],
+                    "response_time": response['response_time'],
+                    "run_id": run_id,
+                    "query_params": case.get('query_params') or "",
+                    "timings": response.get('timings'),
+                    "attempts": response.get('attempts'),
+                    "backoff_time": response.get('backoff_time')
+                }
+                for case, run_id, before, after in runs
+                for config, response in ((before_config, before), (after_config, after))
+            )
+            
+            for (case, run_id, before, after), comparison in zip(runs, comparisons):
+                yield {
+                    "test_case_name": case['name'],
+                    "run_id": run_id,
+                    "before": before,
+                    "after": after,
+                    "comparison": comparison
+                }
+    
+    def run_load(self, task_name: str, test_case_name: str, payload: Dict = None,
+                 query_params: str = "", duration: float = LOAD_DEFAULT_DURATION,
+                 rate: Optional[float] = None, concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Load both versions of a task with one test case over the same time window
+        
+        Each version gets its own load at the given rate or concurrency, and
+        both start together so they see the same network and backend
+        conditions. Both results are saved under one run ID.
+        
+        Args:
+            task_name: Task whose "Before Change" and "After Change" configs are used
+            test_case_name: Name to store the results under
+            payload: Request payload (for POST, PUT)
+            query_params: Query parameters string (for GET)
+            duration: Seconds to keep sending requests
+            rate: Target requests per second per version (open loop)
+            concurrency: Concurrent requests per version (closed loop), used when rate is not given
+        
+        Returns:
+            Dictionary with the run ID and a LoadResult per version
+        """
+        before_config, after_config = self.get_config_pair(task_name)
+        if not before_config or not after_config:
+            raise ValueError(
+                f"Task '{task_name}' needs both '{BEFORE_VERSION}' and '{AFTER_VERSION}' configurations"
+            )
+        
+        generator = LoadGenerator(self.api_manager)
+        start_at = perf_counter() + 0.1
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            before, after = [
+                executor.submit(generator.run, config, payload, query_params,
+                                duration, rate, concurrency, start_at)
+                for config in (before_config, after_config)
+            ]
+            before, after = before.result(), after.result()
+        
+        run_id = uuid.uuid4().hex
+        self.db.save_load_results(
+            {
+                "run_id": run_id,
+                "config_id": config['id'],
+                "test_case_name": test_case_name,
+                "mode": "rate" if rate is not None else "concurrency",
+                "target": rate if rate is not None else concurrency,
+                "summary": result.summary(),
+                "histogram": result.histogram.to_dict()
+            }
+            for config, result in ((before_config, before), (after_config, after))
+        )
+        
+        return {
+            "run_id": run_id,
+            BEFORE_VERSION: before,
+            AFTER_VERSION: after
+        }
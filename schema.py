@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# Path of the response itself in flattened schemas; other paths use the
+# comparison settings' syntax ("data.items[*].id")
+ROOT_PATH = "(root)"
+
+
+_JSON_TYPES = {type(None): 'null', bool: 'boolean', int: 'integer', float: 'number', str: 'string',
+               dict: 'object', list: 'array'}
+
+
+def json_type(value: Any) -> str:
+    """Get the JSON type name of a parsed value"""
+    kind = _JSON_TYPES.get(type(value))
+    if kind is None:  # subclasses and other sequences
+        kind = next((name for cls, name in _JSON_TYPES.items() if isinstance(value, cls)), 'array')
+    return kind
+
+
+def infer_schema(value: Any, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Add a parsed response to a schema, creating the schema if none is given
+    
+    A schema node counts the values seen at its position ('count') by JSON
+    type ('types'). Object nodes hold a node per field in 'fields', whose
+    count is the number of objects that had the field; array nodes merge
+    every element into one 'items' node and track 'min_items'/'max_items'.
+    Every element of every array is visited, not just the first.
+    
+    Args:
+        value: Parsed JSON response
+        schema: Schema to add the response to (updated in place)
+    
+    Returns:
+        The updated schema
+    """
+    schema = schema if schema is not None else {}
+    stack = [(schema, value)]
+    while stack:
+        node, value = stack.pop()
+        kind = json_type(value)
+        node['count'] = node.get('count', 0) + 1
+        types = node.setdefault('types', {})
+        types[kind] = types.get(kind, 0) + 1
+        
+        if kind == 'object':
+            fields = node.setdefault('fields', {})
+            for key, child in value.items():
+                stack.append((fields.setdefault(key, {}), child))
+        elif kind == 'array':
+            length = len(value)
+            node['min_items'] = min(node.get('min_items', length), length)
+            node['max_items'] = max(node.get('max_items', length), length)
+            if value:
+                items = node.setdefault('items', {})
+                stack.extend((items, child) for child in value)
+    return schema
+
+
+def flatten_schema(schema: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Describe every position of a schema by path
+    
+    Returns:
+        Dictionary mapping paths to their 'types' (sorted type names),
+        'optional' (whether some objects lacked the field) and, for arrays,
+        'min_items' and 'max_items'
+    """
+    flat = {}
+    if not schema:
+        return flat
+    # (path, node, number of parent objects, or None for array items and the root)
+    stack: List[Tuple[str, Dict[str, Any], Optional[int]]] = [("", schema, None)]
+    while stack:
+        path, node, parents = stack.pop()
+        entry = {
+            "types": sorted(node.get('types', {})),
+            "optional": parents is not None and node.get('count', 0) < parents
+        }
+        if 'min_items' in node:
+            entry['min_items'] = node['min_items']
+            entry['max_items'] = node['max_items']
+        flat[path or ROOT_PATH] = entry
+        
+        if 'items' in node:
+            stack.append((f"{path}[*]", node['items'], None))
+        objects = node.get('types', {}).get('object', 0)
+        for key, child in node.get('fields', {}).items():
+            stack.append((f"{path}.{key}" if path else key, child, objects))
+    return flat
+
+
+def diff_schemas(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compare the schemas of two versions of an endpoint
+    
+    Returns:
+        Dictionary with 'identical' plus the paths 'added' and 'removed' in
+        after, and per path 'type_changes', 'optionality_changes' and
+        'cardinality_changes' as {"before": ..., "after": ...}. Array sizes
+        vary with the data, so cardinality changes alone do not make the
+        schemas different.
+    """
+    flat1, flat2 = flatten_schema(before), flatten_schema(after)
+    type_changes, optionality_changes, cardinality_changes = {}, {}, {}
+    for path in sorted(flat1.keys() & flat2.keys()):
+        entry1, entry2 = flat1[path], flat2[path]
+        if entry1['types'] != entry2['types']:
+            type_changes[path] = {"before": entry1['types'], "after": entry2['types']}
+        if entry1['optional'] != entry2['optional']:
+            optionality_changes[path] = {
+                "before": "optional" if entry1['optional'] else "required",
+                "after": "optional" if entry2['optional'] else "required"
+            }
+        items1 = (entry1.get('min_items'), entry1.get('max_items'))
+        items2 = (entry2.get('min_items'), entry2.get('max_items'))
+        if 'min_items' in entry1 and 'min_items' in entry2 and items1 != items2:
+            cardinality_changes[path] = {"before": list(items1), "after": list(items2)}
+    
+    added = sorted(flat2.keys() - flat1.keys())
+    removed = sorted(flat1.keys() - flat2.keys())
+    return {
+        "identical": not (added or removed or type_changes or optionality_changes),
+        "added": added,
+        "removed": removed,
+        "type_changes": type_changes,
+        "optionality_changes": optionality_changes,
+        "cardinality_changes": cardinality_changes
+    }
@@ -0,0 +1,219 @@
+import json
+import queue
+import random
+import threading
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+from capture import storage_fields
+from runner import PairedRunner
+from config import (BEFORE_VERSION, AFTER_VERSION, SUITE_CHUNK_SIZE, SHADOW_SAMPLE_RATE,
+                    SHADOW_QUEUE_SIZE, SHADOW_WORKERS)
+
+# The body is sent decoded and with its own length, so these no longer apply
+_RESPONSE_DROPPED_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+                             'content-length', 'server', 'date'}
+
+
+def shadow_case_name(method: str, path: str) -> str:
+    """Name shadowed requests are stored under, e.g. "GET /flights?page=2" """
+    parts = urlsplit(path)
+    name = f"{method.upper()} {parts.path}"
+    return f"{name}?{parts.query}" if parts.query else name
+
+
+def _payload_text(body: bytes) -> str:
+    """Get the request_payload text to store for a raw request body"""
+    if not body:
+        return json.dumps(None)
+    try:
+        return json.dumps(json.loads(body))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return json.dumps(body.decode('utf-8', errors='replace'))
+
+
+class ShadowProxy(ThreadingHTTPServer):
+    """
+    Reverse proxy that compares real traffic between the two versions of a task
+    
+    Each request is forwarded to "Before Change" and its response returned
+    to the client. A sample of requests is then queued for worker threads
+    that send the same request to "After Change", compare the two responses
+    and save both under one run ID. The queue is bounded and only ever
+    added to without waiting, so a slow "After Change" makes the proxy drop
+    mirrors instead of delaying clients.
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, runner: PairedRunner, task_name: str, host: str = '127.0.0.1', port: int = 0,
+                 sample_rate: float = SHADOW_SAMPLE_RATE, queue_size: int = SHADOW_QUEUE_SIZE,
+                 workers: int = SHADOW_WORKERS):
+        self.before_config, self.after_config = runner.get_config_pair(task_name)
+        if not self.before_config or not self.after_config:
+            raise ValueError(f"Task '{task_name}' needs both a '{BEFORE_VERSION}' and an "
+                             f"'{AFTER_VERSION}' configuration")
+        self.runner = runner
+        self.task_name = task_name
+        self.rules = runner.get_rules(task_name)
+        self.sample_rate = sample_rate
+        self.mirrors: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        
+        self.counts = dict.fromkeys(
+            ('proxied', 'sampled_out', 'dropped', 'compared', 'different', 'failed', 'unsaved'), 0
+        )
+        self._counts_lock = threading.Lock()
+        super().__init__((host, port), _ShadowHandler)
+        
+        self._workers = [
+            threading.Thread(target=self._mirror_worker, daemon=True) for _ in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def _count(self, name: str, amount: int = 1):
+        with self._counts_lock:
+            self.counts[name] += amount
+    
+    def stats(self) -> Dict[str, int]:
+        """Get the request counters and the number of mirrors waiting"""
+        with self._counts_lock:
+            return dict(self.counts, queued=self.mirrors.qsize())
+    
+    def mirror(self, method: str, path: str, headers: Dict[str, str], body: bytes,
+               before: Dict[str, Any]):
+        """Queue a proxied request to be sent to "After Change", if sampled and there is room"""
+        if random.random() >= self.sample_rate:
+            self._count('sampled_out')
+            return
+        try:
+            self.mirrors.put_nowait((method, path, headers, body, before))
+        except queue.Full:
+            self._count('dropped')
+    
+    def _mirror_worker(self):
+        rows: List[Dict[str, Any]] = []
+        while True:
+            item = self.mirrors.get()
+            if item is None:
+                break
+            method, path, headers, body, before = item
+            try:
+                # Mirrors may not be idempotent, so like the client's request they are never retried
+                after = self.runner.api_manager.forward_request(
+                    self.after_config, method, path, headers, body, retry=False
+                )
+                # Bodies are only parsed if no stored result is found
+                comparison = self.runner.comparator.compare_responses(
+                    lambda: before['body'], lambda: after['body'],
+                    key1=before['body_hash'], key2=after['body_hash'],
+                    rules=self.rules
+                )
+            except Exception:
+                # One bad pair must not stop the worker
+                self._count('failed')
+                continue
+            self._count('compared')
+            if not comparison['identical']:
+                self._count('different')
+            
+            run_id = uuid.uuid4().hex
+            query = urlsplit(path).query
+            for config, response in ((self.before_config, before), (self.after_config, after)):
+                rows.append({
+                    "config_id": config['id'],
+                    "test_case_name": shadow_case_name(method, path),
+                    "request_payload": _payload_text(body),
+                    **storage_fields(response),
+                    "status_code": response['status_code'],
+                    "response_time": response['response_time'],
+                    "run_id": run_id,
+                    "query_params": query,
+                    "timings": response.get('timings'),
+                    "attempts": response.get('attempts'),
+                    "backoff_time": response.get('backoff_time')
+                })
+            # Save in batches while traffic is heavy, right away when it is not
+            if len(rows) >= SUITE_CHUNK_SIZE or self.mirrors.empty():
+                self._save(rows)
+                rows = []
+        if rows:
+            self._save(rows)
+    
+    def _save(self, rows: List[Dict[str, Any]]):
+        """Save compared pairs; a failed save is counted and must not stop the worker"""
+        try:
+            self.runner.db.save_test_results_bulk(rows)
+        except Exception:
+            self._count('unsaved', len(rows) // 2)
+    
+    def server_close(self):
+        """Stop accepting requests, then finish the queued mirrors"""
+        super().server_close()
+        for _ in self._workers:
+            self.mirrors.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+class _ShadowHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def _proxy(self, mirror: bool = True):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        headers = dict(self.headers)
+        
+        # The client's request is never retried, the proxy only relays it
+        before = self.server.runner.api_manager.forward_request(
+            self.server.before_config, self.command, self.path, headers, body, retry=False
+        )
+        self.server._count('proxied')
+        if before['status_code'] == 0:
+            status = 502
+            response_headers = {'Content-Type': 'application/json'}
+            payload = json.dumps(before['body']).encode('utf-8')
+        else:
+            status = before['status_code']
+            response_headers = {
+                name: value for name, value in before['headers'].items()
+                if name.lower() not in _RESPONSE_DROPPED_HEADERS
+            }
+            payload = before['capture'].read_bytes()
+        
+        self.send_response(status)
+        for name, value in response_headers.items():
+            self.send_header(name, value)
+        if self.command == 'HEAD':
+            # No body is sent, so pass on the length a GET would have had
+            self.send_header('Content-Length', next(
+                (value for name, value in before['headers'].items() if name.lower() == 'content-length'),
+                str(len(payload))
+            ))
+        else:
+            self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+        self.wfile.flush()
+        
+        # Only after the client has its response
+        if mirror and before['status_code'] != 0:
+            self.server.mirror(self.command, self.path, headers, body, before)
+    
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = _proxy
+    
+    def do_HEAD(self):
+        # Forwarded so clients and CORS preflights work, but there is no body worth comparing
+        self._proxy(mirror=False)
+    
+    do_OPTIONS = do_HEAD
+    
+    def log_message(self, format, *args):
+        pass
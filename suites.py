@@ -0,0 +1,190 @@
+import io
+import json
+import os
+from urllib.parse import urlencode
+from typing import Any, Dict, IO, Iterator, Optional, Union
+from rules import ComparisonRules
+
+try:
+    import ijson
+except ImportError:  # optional dependency, .json suites are then parsed in one go
+    ijson = None
+
+try:
+    import yaml
+except ImportError:  # optional dependency, only needed for .yaml suites
+    yaml = None
+
+FORMATS = {
+    '.json': 'json',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+}
+
+CASE_FIELDS = {'name', 'payload', 'query_params', 'rules', 'ignore'}
+
+
+def detect_format(filename: str) -> str:
+    """Get the suite format ("json", "jsonl" or "yaml") from a file name"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown suite format {extension!r} (use {', '.join(sorted(FORMATS))})")
+    return FORMATS[extension]
+
+
+def normalize_case(raw: Any, position: str) -> Dict[str, Any]:
+    """
+    Validate one test case from a suite file
+    
+    A case is an object with a "name" and optional "payload", "query_params"
+    (a string or an object), "rules" (comparison settings merged over the
+    task's own) and "ignore" (shorthand for rules["ignore"]).
+    
+    Returns:
+        Dictionary with name, payload, query_params and rules
+    """
+    if not isinstance(raw, dict):
+        raise ValueError(f"{position}: test case must be an object, got {type(raw).__name__}")
+    unknown = set(raw) - CASE_FIELDS
+    if unknown:
+        raise ValueError(f"{position}: unknown field(s) {', '.join(sorted(unknown))}")
+    name = raw.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError(f"{position}: test case needs a non-empty \"name\"")
+    
+    query_params = raw.get('query_params') or ""
+    if isinstance(query_params, dict):
+        query_params = urlencode(query_params, doseq=True)
+    elif not isinstance(query_params, str):
+        raise ValueError(f"{position}: \"query_params\" must be a string or an object")
+    
+    rules = dict(raw.get('rules') or {})
+    if raw.get('ignore'):
+        rules['ignore'] = list(rules.get('ignore', [])) + list(raw['ignore'])
+    if rules:
+        try:
+            ComparisonRules.from_settings(rules)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f"{position}: invalid rules: {e}")
+    
+    return {
+        "name": name.strip(),
+        "payload": raw.get('payload'),
+        "query_params": query_params,
+        "rules": rules or None
+    }
+
+
+def _text(stream: IO) -> IO[str]:
+    return stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, encoding='utf-8')
+
+
+def _iter_jsonl(stream: IO) -> Iterator[Any]:
+    for line_number, line in enumerate(_text(stream), start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            yield f"line {line_number}", json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {line_number}: invalid JSON: {e}")
+
+
+def _iter_json(stream: IO) -> Iterator[Any]:
+    if ijson is not None and not isinstance(stream, io.TextIOBase) and stream.seekable():
+        try:
+            prefix = _json_cases_prefix(stream)
+            if prefix is not None:
+                for index, raw in enumerate(ijson.items(stream, prefix, use_float=True)):
+                    yield f"case {index + 1}", raw
+                return
+        except ijson.JSONError as e:
+            raise ValueError(f"invalid JSON: {e}")
+    
+    yield from _iter_document(json.load(_text(stream)))
+
+
+def _json_cases_prefix(stream: IO) -> Optional[str]:
+    """
+    Peek at the top level of a JSON suite to pick the ijson prefix of its cases
+    
+    Returns:
+        'item' for [...], 'cases.item' for {"cases": [...]}, or None for
+        anything else (e.g. a single case), which is then parsed whole
+    """
+    start = stream.tell()
+    head = stream.read(1)
+    while head and head.isspace():
+        head = stream.read(1)
+    stream.seek(start)
+    if head == b'[':
+        return 'item'
+    if head != b'{':
+        return None
+    
+    # "cases" usually comes first, so this stops early for a suite object
+    try:
+        has_cases = any(
+            prefix == '' and event == 'map_key' and value == 'cases'
+            for prefix, event, value in ijson.parse(stream, use_float=True)
+        )
+    finally:
+        stream.seek(start)
+    return 'cases.item' if has_cases else None
+
+
+def _iter_yaml(stream: IO) -> Iterator[Any]:
+    if yaml is None:
+        raise ImportError("YAML suites need the 'PyYAML' package (pip install pyyaml)")
+    # Each "---" document is loaded on its own, so multi-document suites stream
+    index = 0
+    try:
+        for document in yaml.safe_load_all(_text(stream)):
+            if document is None:
+                continue
+            for _, raw in _iter_document(document):
+                index += 1
+                yield f"case {index}", raw
+    except yaml.YAMLError as e:
+        raise ValueError(f"invalid YAML: {e}")
+
+
+def _iter_document(document: Any) -> Iterator[Any]:
+    """Yield the cases of a parsed document: a list, {"cases": [...]} or a single case"""
+    if isinstance(document, dict) and 'cases' in document:
+        document = document['cases']
+    if isinstance(document, dict):
+        document = [document]
+    if not isinstance(document, list):
+        raise ValueError("Suite must be a list of test cases or an object with a \"cases\" list")
+    for index, raw in enumerate(document):
+        yield f"case {index + 1}", raw
+
+
+def iter_suite(source: Union[str, IO], fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Read test cases from a suite file lazily
+    
+    JSONL suites are read line by line and multi-document YAML suites one
+    document at a time. JSON suites stream when the optional 'ijson' package
+    is installed and are parsed whole otherwise.
+    
+    Args:
+        source: Path, or a text or binary file object (e.g. an uploaded file)
+        fmt: "json", "jsonl" or "yaml"; detected from the file name if omitted
+    
+    Returns:
+        Iterator of test case dictionaries (see normalize_case)
+    """
+    if isinstance(source, str):
+        fmt = fmt or detect_format(source)
+        with open(source, 'rb') as stream:
+            yield from iter_suite(stream, fmt)
+        return
+    
+    fmt = fmt or detect_format(getattr(source, 'name', ''))
+    readers = {'json': _iter_json, 'jsonl': _iter_jsonl, 'yaml': _iter_yaml}
+    for position, raw in readers[fmt](source):
+        yield normalize_case(raw, position)
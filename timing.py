@@ -0,0 +1,178 @@
+import socket
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, Iterator
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+# Phases of a request, in the order they happen
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'download', 'parse')
+
+PHASE_LABELS = {
+    'dns': 'DNS lookup',
+    'connect': 'TCP connect',
+    'tls': 'TLS handshake',
+    'ttfb': 'Time to first byte',
+    'download': 'Body download',
+    'parse': 'JSON parse',
+}
+
+# What a slowdown in each phase usually points to
+PHASE_CAUSES = {
+    'dns': 'name resolution',
+    'connect': 'the network or connection setup',
+    'tls': 'the network or connection setup',
+    'ttfb': 'server processing time',
+    'download': 'a larger payload or slower transfer',
+    'parse': 'a larger or more complex payload',
+}
+
+_current = threading.local()
+
+
+def new_timings() -> Dict[str, float]:
+    """Get a timings dictionary with every phase at zero"""
+    return dict.fromkeys(PHASES, 0.0)
+
+
+@contextmanager
+def recording(timings: Dict[str, float]) -> Iterator[Dict[str, float]]:
+    """Record the connection phases of requests made by this thread into timings"""
+    previous = getattr(_current, 'timings', None)
+    _current.timings = timings
+    try:
+        yield timings
+    finally:
+        _current.timings = previous
+
+
+def _record(phase: str, seconds: float):
+    timings = getattr(_current, 'timings', None)
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+# httpcore trace events that bracket a phase; name resolution happens inside connect_tcp
+_TRACE_PHASES = {
+    'connection.connect_tcp': 'connect',
+    'connection.start_tls': 'tls',
+}
+
+
+def trace_recorder(timings: Dict[str, float]) -> Callable[[str, Dict], Awaitable[None]]:
+    """
+    Get an httpx "trace" extension callback recording phases into timings
+    
+    httpcore resolves names as part of connecting, so 'dns' stays zero and
+    'connect' includes the lookup.
+    """
+    started: Dict[str, float] = {}
+    
+    async def trace(event_name: str, info: Dict):
+        name, _, stage = event_name.rpartition('.')
+        now = perf_counter()
+        if name.endswith('.send_request_headers'):
+            name = 'ttfb'
+        elif name.endswith('.receive_response_headers'):
+            if stage == 'complete' and 'ttfb' in started:
+                timings['ttfb'] = timings.get('ttfb', 0.0) + now - started.pop('ttfb')
+            return
+        elif name not in _TRACE_PHASES:
+            return
+        
+        if stage == 'started':
+            started[name] = now
+        elif stage == 'complete' and name in _TRACE_PHASES and name in started:
+            phase = _TRACE_PHASES[name]
+            timings[phase] = timings.get(phase, 0.0) + now - started.pop(name)
+    
+    return trace
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """
+    HTTPConnection that reports DNS, connect and time-to-first-byte phases
+    
+    Phases are only recorded while the calling thread is inside recording();
+    a reused keep-alive connection reports no DNS, connect or TLS time.
+    """
+    
+    def _new_conn(self):
+        if getattr(_current, 'timings', None) is None:
+            return super()._new_conn()
+        
+        started = perf_counter()
+        host = self._dns_host
+        try:
+            addresses = list(dict.fromkeys(
+                info[4][0] for info in socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)
+            ))
+        except socket.gaierror:
+            addresses = []
+        if not addresses:
+            # Let urllib3 resolve again and raise its usual error
+            return super()._new_conn()
+        resolved = perf_counter()
+        _record('dns', resolved - started)
+        
+        # Try each resolved address in turn, as urllib3 does, e.g. ::1 and then
+        # 127.0.0.1 for localhost; TLS still uses self.host for SNI
+        try:
+            for position, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except (NewConnectionError, ConnectTimeoutError):
+                    if position == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        self._connected_at = perf_counter()
+        _record('connect', self._connected_at - resolved)
+        return sock
+    
+    def request(self, *args, **kwargs):
+        self._request_started = perf_counter()
+        return super().request(*args, **kwargs)
+    
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        started = getattr(self, '_request_started', None)
+        if started is not None:
+            # From sending the request until the status line and headers are read
+            _record('ttfb', perf_counter() - started)
+            self._request_started = None
+        return response
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    """HTTPSConnection that also reports the TLS handshake phase"""
+    
+    def connect(self):
+        self._connected_at = None
+        super().connect()
+        if self._connected_at is not None:
+            _record('tls', perf_counter() - self._connected_at)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimingAdapter(HTTPAdapter):
+    """Transport adapter whose connections report per-phase timings"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }